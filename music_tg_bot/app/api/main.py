@@ -1,15 +1,63 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
+from app.api.middleware import DbSessionMiddleware
 from app.api.routes.health import router as health_router
+from app.api.routes.telegram_webhook import WEBHOOK_PATH, drain_background_tasks, router as telegram_router
 from app.api.routes.yookassa_webhook import router as yookassa_router
+from app.core.config import settings
 from app.core.logging import setup_logging
+from app.integrations import yookassa
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if settings.bot_mode != "webhook":
+        try:
+            yield
+        finally:
+            await yookassa.close_client()
+        return
+    if not settings.telegram_webhook_secret:
+        logging.getLogger("api").error("Не задан TELEGRAM_WEBHOOK_SECRET для режима webhook")
+        raise RuntimeError("TELEGRAM_WEBHOOK_SECRET отсутствует")
+    from app.bot.main import create_bot, create_dispatcher
+
+    bot = create_bot()
+    dispatcher = create_dispatcher()
+    app.state.bot = bot
+    app.state.dispatcher = dispatcher
+    await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+    await bot.set_webhook(
+        f"{settings.base_url}{WEBHOOK_PATH}",
+        secret_token=settings.telegram_webhook_secret,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+    )
+    logging.getLogger("api").info("Webhook Telegram установлен")
+    try:
+        yield
+    finally:
+        await drain_background_tasks()
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        await bot.session.close()
 
 
 def create_app() -> FastAPI:
     setup_logging()
-    app = FastAPI(title="Music TG Bot API")
+    app = FastAPI(
+        title="Music TG Bot API",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan,
+    )
+    app.add_middleware(DbSessionMiddleware)
     app.include_router(health_router)
     app.include_router(yookassa_router, prefix="/api/payments")
+    if settings.bot_mode == "webhook":
+        app.include_router(telegram_router)
     return app
 
 
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.db import close_request_session, open_request_session
+
+
+class DbSessionMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = open_request_session()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await close_request_session(token)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 @router.get("/health")
-async def health() -> dict:
-    return {"status": "ok"}
+async def health() -> ORJSONResponse:
+    return ORJSONResponse({"status": "ok"})
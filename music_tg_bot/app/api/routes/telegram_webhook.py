@@ -0,0 +1,59 @@
+import asyncio
+import hmac
+import logging
+
+from aiogram.types import Update
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse
+
+from app.core.config import settings
+
+router = APIRouter(default_response_class=ORJSONResponse)
+logger = logging.getLogger("api.telegram")
+
+WEBHOOK_PATH = "/tg/webhook"
+UPDATE_DRAIN_SECONDS = 10
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _is_valid_secret(secret: str | None) -> bool:
+    expected = settings.telegram_webhook_secret
+    if not expected or secret is None:
+        return False
+    return hmac.compare_digest(secret.encode(), expected.encode())
+
+
+def _on_update_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Ошибка обработки update", exc_info=task.exception())
+
+
+async def drain_background_tasks() -> None:
+    if not _background_tasks:
+        return
+    _, pending = await asyncio.wait(set(_background_tasks), timeout=UPDATE_DRAIN_SECONDS)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("Прервано необработанных update: %s", len(pending))
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+@router.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request) -> ORJSONResponse:
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+    if not _is_valid_secret(secret):
+        raise HTTPException(status_code=401, detail="Неверный секрет webhook")
+    bot = request.app.state.bot
+    dispatcher = request.app.state.dispatcher
+    try:
+        update = Update.model_validate_json(await request.body(), context={"bot": bot})
+    except ValueError as exc:
+        logger.warning("Некорректный update от Telegram: %s", exc)
+        raise HTTPException(status_code=400, detail="Некорректный update") from exc
+    task = asyncio.create_task(dispatcher.feed_update(bot, update))
+    _background_tasks.add(task)
+    task.add_done_callback(_on_update_done)
+    return ORJSONResponse({"ok": True})
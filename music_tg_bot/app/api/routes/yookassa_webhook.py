@@ -1,26 +1,60 @@
 import logging
+from collections import OrderedDict
 
+import orjson
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 
-from app.core.db import SessionLocal
-from app.core.repo import get_or_create_user, add_topup
+from app.core.cache import invalidate_balance
+from app.core.db import async_engine
+from app.core.repo import add_topup
 from app.integrations.yookassa import parse_webhook, YooKassaError
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = logging.getLogger("api.yookassa")
 
+_SEEN_PAYMENTS_LIMIT = 10_000
+_seen_payments: OrderedDict[str, None] = OrderedDict()
+
+
+def _remember_payment(payment_id: str) -> None:
+    _seen_payments[payment_id] = None
+    _seen_payments.move_to_end(payment_id)
+    if len(_seen_payments) > _SEEN_PAYMENTS_LIMIT:
+        _seen_payments.popitem(last=False)
+
+
+async def _persist_topup(payment_id: str, tg_id: int, amount: int) -> None:
+    try:
+        async with async_engine.begin() as connection:
+            credited = await connection.run_sync(add_topup, tg_id, amount, payment_id)
+    except Exception as exc:
+        logger.exception(
+            "Не удалось зачислить платёж",
+            extra={"payment_id": payment_id, "user_id": tg_id, "amount": amount},
+        )
+        raise HTTPException(status_code=503, detail="Платёж не зачислен") from exc
+    _remember_payment(payment_id)
+    if not credited:
+        logger.info("Платёж уже зачислен", extra={"payment_id": payment_id})
+        return
+    await invalidate_balance(tg_id)
+
 
 @router.post("/yookassa/webhook")
-async def yookassa_webhook(request: Request) -> dict:
-    payload = await request.json()
+async def yookassa_webhook(request: Request) -> ORJSONResponse:
+    try:
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as exc:
+        logger.warning("Webhook отклонён: некорректный JSON")
+        raise HTTPException(status_code=400, detail="Некорректный JSON") from exc
     try:
         payment_id, user_id, amount = parse_webhook(payload)
     except YooKassaError as exc:
         logger.warning("Webhook отклонён: %s", exc)
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if payment_id in _seen_payments:
+        return ORJSONResponse({"status": "ok"})
 
-    with SessionLocal() as session:
-        user = get_or_create_user(session, user_id)
-        add_topup(session, user, amount, payment_id)
-
-    return {"status": "ok"}
+    await _persist_topup(payment_id, user_id, amount)
+    return ORJSONResponse({"status": "ok"})
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class TopupCallback(CallbackData, prefix="topup"):
+    amount: int
+
+
+class CreateCategoryCallback(CallbackData, prefix="create_category"):
+    category_id: str
+
+
+class PresetCategoryCallback(CallbackData, prefix="preset_category"):
+    category_id: str
+
+
+class PresetCallback(CallbackData, prefix="preset"):
+    preset_id: str
+
+
+class PresetInfoCallback(CallbackData, prefix="presetinfo"):
+    preset_id: str
+
+
+class ReviewCallback(CallbackData, prefix="review"):
+    action: str
+
+
+class TrackCallback(CallbackData, prefix="track"):
+    action: str
+    track_id: int
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+EDIT_DEBOUNCE_SECONDS = 0.3
+_RENDERED_LIMIT = 10_000
+
+
+@dataclass
+class _PendingEdit:
+    text: str
+    reply_markup: Any
+    future: asyncio.Future[None]
+    task: asyncio.Task[None] | None = None
+
+
+def _bounded_set(cache: OrderedDict, key: tuple[int, int], value: Any) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > _RENDERED_LIMIT:
+        cache.popitem(last=False)
+
+
+class EditDebouncer:
+    def __init__(self, delay: float = EDIT_DEBOUNCE_SECONDS) -> None:
+        self.delay = delay
+        self._pending: dict[tuple[int, int], _PendingEdit] = {}
+        self._rendered: OrderedDict[tuple[int, int], tuple[str, Any]] = OrderedDict()
+        self._sent_at: OrderedDict[tuple[int, int], float] = OrderedDict()
+
+    async def edit(
+        self,
+        bot: Bot,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        reply_markup: Any = None,
+    ) -> None:
+        key = (chat_id, message_id)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.text = text
+            pending.reply_markup = reply_markup
+            await pending.future
+            return
+        loop = asyncio.get_running_loop()
+        wait = self._sent_at.get(key, float("-inf")) + self.delay - loop.time()
+        if wait <= 0:
+            _bounded_set(self._sent_at, key, loop.time())
+            await self._send(bot, key, text, reply_markup)
+            return
+        pending = _PendingEdit(text, reply_markup, loop.create_future())
+        self._pending[key] = pending
+        pending.task = asyncio.create_task(self._flush(bot, key, wait))
+        await pending.future
+
+    async def _flush(self, bot: Bot, key: tuple[int, int], wait: float) -> None:
+        await asyncio.sleep(wait)
+        pending = self._pending.pop(key)
+        _bounded_set(self._sent_at, key, asyncio.get_running_loop().time())
+        try:
+            await self._send(bot, key, pending.text, pending.reply_markup)
+        except Exception as exc:
+            pending.future.set_exception(exc)
+            return
+        pending.future.set_result(None)
+
+    async def _send(self, bot: Bot, key: tuple[int, int], text: str, reply_markup: Any) -> None:
+        if self._rendered.get(key) == (text, reply_markup):
+            return
+        try:
+            await bot.edit_message_text(
+                chat_id=key[0],
+                message_id=key[1],
+                text=text,
+                reply_markup=reply_markup,
+            )
+        except TelegramBadRequest as exc:
+            if "message is not modified" not in str(exc):
+                raise
+        _bounded_set(self._rendered, key, (text, reply_markup))
+
+
+progress_debouncer = EditDebouncer()
@@ -1,62 +1,50 @@
+import re
+
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import BaseFilter, Command
 from aiogram.filters.command import CommandObject
 from aiogram.types import Message
 
+from app.core.cache import load_balance, set_cached_balance
 from app.core.config import settings
-from app.core.db import SessionLocal
+from app.core.db import get_request_session, run_db
 from app.core.repo import adjust_balance, get_balance
 
-router = Router()
+_ADMIN_IDS: frozenset[int] = frozenset(settings.admin_ids)
+_SINGLE_INT_ARG = re.compile(r"\s*(-?\d+)\s*")
+_TWO_INT_ARGS = re.compile(r"\s*(-?\d+)\s+(-?\d+)\s*")
 
 
-def _is_admin(message: Message) -> bool:
-    if not message.from_user:
-        return False
-    return message.from_user.id in settings.admin_ids
+class IsAdmin(BaseFilter):
+    async def __call__(self, message: Message) -> bool:
+        return bool(message.from_user) and message.from_user.id in _ADMIN_IDS
+
+
+router = Router()
+router.message.filter(IsAdmin())
 
 
 def _parse_single_int_arg(command: CommandObject) -> int | None:
-    if not command.args:
-        return None
-    parts = command.args.split()
-    if len(parts) != 1:
-        return None
-    try:
-        return int(parts[0])
-    except ValueError:
-        return None
+    match = _SINGLE_INT_ARG.fullmatch(command.args or "")
+    return int(match.group(1)) if match else None
 
 
 def _parse_two_int_args(command: CommandObject) -> tuple[int, int] | None:
-    if not command.args:
-        return None
-    parts = command.args.split()
-    if len(parts) != 2:
+    match = _TWO_INT_ARGS.fullmatch(command.args or "")
+    if not match:
         return None
-    try:
-        first = int(parts[0])
-        second = int(parts[1])
-    except ValueError:
-        return None
-    return first, second
+    return int(match.group(1)), int(match.group(2))
 
 
 @router.message(Command("dev_balance"))
 async def dev_balance(message: Message) -> None:
-    if not _is_admin(message):
-        await message.answer("⛔ Команда недоступна")
-        return
-    with SessionLocal() as session:
-        balance = get_balance(session, message.from_user.id)
+    session = get_request_session()
+    balance = await load_balance(session, message.from_user.id)
     await message.answer(f"💳 Баланс: {balance} ₽")
 
 
 @router.message(Command("dev_add_balance"))
 async def dev_add_balance(message: Message, command: CommandObject) -> None:
-    if not _is_admin(message):
-        await message.answer("⛔ Команда недоступна")
-        return
     amount = _parse_single_int_arg(command)
     if amount is None:
         await message.answer("Использование: /dev_add_balance 1000")
@@ -64,16 +52,13 @@ async def dev_add_balance(message: Message, command: CommandObject) -> None:
     if amount < 0:
         await message.answer("Сумма должна быть положительной")
         return
-    with SessionLocal() as session:
-        balance = adjust_balance(session, message.from_user.id, amount, "admin_add")
+    balance = await run_db(adjust_balance, message.from_user.id, amount, "admin_add")
+    await set_cached_balance(message.from_user.id, balance)
     await message.answer(f"💳 Баланс пополнен на {amount} ₽. Текущий баланс: {balance} ₽")
 
 
 @router.message(Command("dev_set_balance"))
 async def dev_set_balance(message: Message, command: CommandObject) -> None:
-    if not _is_admin(message):
-        await message.answer("⛔ Команда недоступна")
-        return
     amount = _parse_single_int_arg(command)
     if amount is None:
         await message.answer("Использование: /dev_set_balance 500")
@@ -81,21 +66,18 @@ async def dev_set_balance(message: Message, command: CommandObject) -> None:
     if amount < 0:
         await message.answer("Сумма должна быть положительной")
         return
-    with SessionLocal() as session:
-        current_balance = get_balance(session, message.from_user.id)
-        delta = amount - current_balance
-        if delta == 0:
-            balance = current_balance
-        else:
-            balance = adjust_balance(session, message.from_user.id, delta, "admin_set")
+    current_balance = await run_db(get_balance, message.from_user.id)
+    delta = amount - current_balance
+    if delta == 0:
+        balance = current_balance
+    else:
+        balance = await run_db(adjust_balance, message.from_user.id, delta, "admin_set")
+    await set_cached_balance(message.from_user.id, balance)
     await message.answer(f"💳 Баланс установлен: {balance} ₽")
 
 
 @router.message(Command("dev_give_balance"))
 async def dev_give_balance(message: Message, command: CommandObject) -> None:
-    if not _is_admin(message):
-        await message.answer("⛔ Команда недоступна")
-        return
     parsed = _parse_two_int_args(command)
     if parsed is None:
         await message.answer("Использование: /dev_give_balance 123456789 200")
@@ -104,8 +86,8 @@ async def dev_give_balance(message: Message, command: CommandObject) -> None:
     if amount < 0:
         await message.answer("Сумма должна быть положительной")
         return
-    with SessionLocal() as session:
-        balance = adjust_balance(session, tg_id, amount, "admin_add")
+    balance = await run_db(adjust_balance, tg_id, amount, "admin_add")
+    await set_cached_balance(tg_id, balance)
     await message.answer(
         f"✅ Начислено {amount} ₽ пользователю {tg_id}. Баланс теперь: {balance} ₽"
     )
@@ -1,34 +1,33 @@
 import logging
 
-from aiogram import Router
+from aiogram import F, Router
 from aiogram.types import Message, CallbackQuery
 
-from app.bot.keyboards.inline import balance_keyboard
-from app.core.db import SessionLocal
-from app.core.repo import get_balance, get_or_create_user
+from app.bot.callbacks import TopupCallback
+from app.bot.keyboards.inline import BALANCE_KEYBOARD
+from app.core.cache import load_balance
+from app.core.db import get_request_session
 from app.integrations.yookassa import create_payment, YooKassaError
 
 router = Router()
 logger = logging.getLogger("bot.balance")
 
 
-@router.message(lambda message: message.text == "💳 Баланс")
+@router.message(F.text == "💳 Баланс")
 async def show_balance(message: Message) -> None:
-    with SessionLocal() as session:
-        balance = get_balance(session, message.from_user.id)
+    session = get_request_session()
+    balance = await load_balance(session, message.from_user.id)
     await message.answer(
         f"Ваш баланс: {balance} ₽\nВыберите сумму пополнения:",
-        reply_markup=balance_keyboard(),
+        reply_markup=BALANCE_KEYBOARD,
     )
 
 
-@router.callback_query(lambda call: call.data.startswith("topup:"))
-async def handle_topup(call: CallbackQuery) -> None:
-    amount = int(call.data.split(":")[1])
-    with SessionLocal() as session:
-        user = get_or_create_user(session, call.from_user.id)
+@router.callback_query(TopupCallback.filter())
+async def handle_topup(call: CallbackQuery, callback_data: TopupCallback) -> None:
+    amount = callback_data.amount
     try:
-        payment_url = create_payment(amount, f"Пополнение баланса на {amount} ₽", user.id)
+        payment_url = await create_payment(amount, f"Пополнение баланса на {amount} ₽", call.from_user.id)
     except YooKassaError as exc:
         logger.error("Ошибка YooKassa: %s", exc)
         await call.message.answer(str(exc))
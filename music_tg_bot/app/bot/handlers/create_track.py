@@ -1,28 +1,39 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+from functools import lru_cache
 
-from aiogram import Router
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
+from sqlalchemy.orm import Session
 
 from app.bot.keyboards.inline import (
-    categories_keyboard,
-    presets_keyboard,
+    AUDIO_PAYMENT_CONFIRM_KEYBOARD,
+    REVIEW_KEYBOARD,
+    TEXT_PAYMENT_CONFIRM_KEYBOARD,
+    TITLE_KEYBOARD,
+    category_list_keyboard,
+    category_presets_keyboard,
     text_payment_keyboard,
-    text_payment_confirm_keyboard,
-    title_keyboard,
-    audio_payment_confirm_keyboard,
 )
-from app.bot.keyboards.reply import main_menu
+from app.bot.callbacks import CreateCategoryCallback, PresetCallback, ReviewCallback, TrackCallback
+from app.bot.edit_debouncer import progress_debouncer
+from app.bot.keyboards.reply import MAIN_MENU
 from app.bot.fsm.states import TrackStates
-from app.core.db import SessionLocal
+from app.core.cache import load_balance, set_cached_balance
+from app.core.db import AsyncSessionLocal, get_request_session, run_db, run_in_session
+from app.core.models import Task
 from app.core.repo import (
+    CHARGE_INSUFFICIENT,
+    CHARGE_NOT_PAYABLE,
     adjust_balance,
-    get_balance,
+    charge_task,
     get_free_quota_remaining,
     get_or_create_user,
-    consume_free_quota,
+    reserve_free_text,
     InsufficientFunds,
     FREE_QUOTA_PER_DAY,
     TEXT_PRICE_RUB,
@@ -41,27 +52,60 @@ from app.core.task_status import (
     WAITING_EDIT_REQUEST,
 )
 from app.core.utils import build_auto_title, is_valid_title, sanitize_title
-from app.presets.loader import load_categories, get_presets_by_category, get_preset
+from app.presets.loader import get_presets_by_category, get_preset
+from app.worker.tasks import (
+    deliver_second_variant,
+    enqueue_audio_generation,
+    enqueue_edit_generation,
+    enqueue_text_generation,
+)
 
 router = Router()
 logger = logging.getLogger("bot.create_track")
 
+TEXT_PAYMENT_KEYBOARD = text_payment_keyboard(TEXT_PRICE_RUB)
+_PAID_TEXT_OFFER_TEMPLATE = (
+    f"Лимит бесплатных текстов исчерпан ({FREE_QUOTA_PER_DAY}/{FREE_QUOTA_PER_DAY}).\n"
+    f"Стоимость генерации текста: {TEXT_PRICE_RUB} ₽.\n"
+    "Баланс: {balance} ₽"
+)
+_PAID_TEXT_CONFIRM_TEMPLATE = f"Цена: {TEXT_PRICE_RUB} ₽ | Баланс: {{balance}} ₽"
+_TITLE_PROMPT_SUFFIX = "\n\n🎼 Введите название трека или нажмите 🎲 Автоназвание"
+_CANCEL_TEXT = "Отмена. Выберите действие в меню."
+_DATA_NOT_FOUND_TEXT = "Данные не найдены. Начните заново."
+_PRESET_NOT_FOUND_TEXT = "Пресет не найден. Начните заново."
+_PRESET_MISSING_TEXT = "Пресет не найден."
+_REVIEW_DATA_NOT_FOUND_TEXT = "Нет данных для ревью. Начните заново."
+_AUDIO_ALREADY_PAID_TEXT = "Этот трек уже оплачен."
+_GENERATION_DATA_NOT_FOUND_TEXT = "Нет данных для генерации. Начните заново."
+_FREE_TEXT_REMAINING_TEMPLATE = f"📝 Бесплатных текстов сегодня: {{remaining}}/{FREE_QUOTA_PER_DAY}"
+
+
+_EDIT_CANCEL_KEYWORDS = frozenset(
+    {
+        "нет",
+        "не надо",
+        "ничего",
+        "отмена",
+        "cancel",
+        "no",
+        ".",
+        "..",
+    }
+)
+
+_background_edits: set[asyncio.Task[None]] = set()
+
 
-_EDIT_CANCEL_KEYWORDS = {
-    "нет",
-    "не надо",
-    "ничего",
-    "отмена",
-    "cancel",
-    "no",
-}
+@lru_cache(maxsize=512)
+def _header_with_balance(header: str, balance: int) -> str:
+    return f"{header}\nБаланс: {balance} ₽"
 
 
 def _preset_line(preset: dict, balance: int | None = None) -> str:
-    line = f"🎛 Пресет: {preset['title']}\nЦена аудио: {preset['price_audio_rub']} ₽"
-    if balance is not None:
-        line = f"{line}\nБаланс: {balance} ₽"
-    return line
+    if balance is None:
+        return preset["header"]
+    return _header_with_balance(preset["header"], balance)
 
 
 def _with_preset(preset: dict, text: str, balance: int | None = None) -> str:
@@ -73,21 +117,39 @@ def _title_line(title: str | None) -> str:
     return f"🎼 Название: {safe_title}" if safe_title else "🎼 Название: —"
 
 
-def _get_user_balance(user_id: int) -> int:
-    with SessionLocal() as session:
-        user = get_or_create_user(session, user_id)
-        return user.balance_rub
+def _is_edit_cancel(text: str | None) -> bool:
+    normalized = text.strip().lower() if text else ""
+    return not normalized or normalized in _EDIT_CANCEL_KEYWORDS
 
 
-def _is_edit_cancel(text: str | None) -> bool:
-    normalized = (text or "").strip().lower()
-    if not normalized:
-        return True
-    if normalized in _EDIT_CANCEL_KEYWORDS:
-        return True
-    if normalized in {".", ".."}:
-        return True
-    return False
+async def _edit_or_resend_progress(
+    bot: Bot,
+    chat_id: int,
+    status_message_id: int,
+    task_id: int,
+    text: str,
+    reply_markup=None,
+) -> None:
+    try:
+        await progress_debouncer.edit(bot, chat_id, status_message_id, text, reply_markup=reply_markup)
+        return
+    except (TelegramBadRequest, TelegramRetryAfter) as exc:
+        logger.warning("Не удалось обновить статусное сообщение: %s", exc)
+    new_message = await bot.send_message(chat_id, text, reply_markup=reply_markup)
+    async with AsyncSessionLocal() as session:
+        await run_in_session(
+            session,
+            update_task,
+            task_id,
+            progress_chat_id=chat_id,
+            progress_message_id=new_message.message_id,
+        )
+
+
+def _on_background_edit_done(task: asyncio.Task[None]) -> None:
+    _background_edits.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Не удалось обновить статусное сообщение", exc_info=task.exception())
 
 
 async def _send_or_edit_progress(
@@ -95,125 +157,158 @@ async def _send_or_edit_progress(
     task_id: int,
     text: str,
     reply_markup=None,
+    *,
+    status_message_id: int | None = None,
+    wait: bool = True,
 ) -> int:
-    with SessionLocal() as session:
-        task = get_task(session, task_id)
+    if status_message_id is None:
+        task = await run_db(get_task, task_id)
         status_message_id = task.progress_message_id if task else None
+    if status_message_id and not wait:
+        background = asyncio.create_task(
+            _edit_or_resend_progress(
+                message.bot,
+                message.chat.id,
+                status_message_id,
+                task_id,
+                text,
+                reply_markup=reply_markup,
+            )
+        )
+        _background_edits.add(background)
+        background.add_done_callback(_on_background_edit_done)
+        return status_message_id
     if status_message_id:
         try:
-            await message.bot.edit_message_text(
-                chat_id=message.chat.id,
-                message_id=status_message_id,
-                text=text,
+            await progress_debouncer.edit(
+                message.bot,
+                message.chat.id,
+                status_message_id,
+                text,
                 reply_markup=reply_markup,
             )
             return status_message_id
-        except Exception as exc:
+        except (TelegramBadRequest, TelegramRetryAfter) as exc:
             logger.warning("Не удалось обновить статусное сообщение: %s", exc)
     new_message = await message.answer(text, reply_markup=reply_markup)
-    with SessionLocal() as session:
-        update_task(
-            session,
-            task_id,
-            progress_chat_id=message.chat.id,
-            progress_message_id=new_message.message_id,
-        )
+    await run_db(
+        update_task,
+        task_id,
+        progress_chat_id=message.chat.id,
+        progress_message_id=new_message.message_id,
+    )
     return new_message.message_id
 
 
 def _free_text_remaining_line(remaining: int) -> str:
-    safe_remaining = max(0, remaining)
-    return f"📝 Бесплатных текстов сегодня: {safe_remaining}/{FREE_QUOTA_PER_DAY}"
+    return _FREE_TEXT_REMAINING_TEMPLATE.format(remaining=max(0, remaining))
 
 
 def _paid_text_offer_message(balance: int) -> str:
-    return (
-        f"Лимит бесплатных текстов исчерпан ({FREE_QUOTA_PER_DAY}/{FREE_QUOTA_PER_DAY}).\n"
-        f"Стоимость генерации текста: {TEXT_PRICE_RUB} ₽.\n"
-        f"Баланс: {balance} ₽"
-    )
+    return _PAID_TEXT_OFFER_TEMPLATE.format(balance=balance)
 
 
 def _paid_text_confirm_message(balance: int) -> str:
-    return f"Цена: {TEXT_PRICE_RUB} ₽ | Баланс: {balance} ₽"
+    return _PAID_TEXT_CONFIRM_TEMPLATE.format(balance=balance)
 
 
-@router.message(lambda message: message.text == "🎵 Создать трек")
+@router.message(F.text == "🎵 Создать трек")
 async def start_create(message: Message, state: FSMContext) -> None:
     await state.clear()
-    categories = load_categories()
-    await message.answer("Выберите категорию:", reply_markup=categories_keyboard(categories, prefix="create_category"))
+    await message.answer("Выберите категорию:", reply_markup=category_list_keyboard(CreateCategoryCallback))
 
 
-@router.callback_query(lambda call: call.data.startswith("create_category:"))
-async def create_category_selected(call: CallbackQuery) -> None:
-    category_id = call.data.split(":")[1]
-    presets = get_presets_by_category(category_id)
+@router.callback_query(CreateCategoryCallback.filter())
+async def create_category_selected(call: CallbackQuery, callback_data: CreateCategoryCallback) -> None:
+    presets = get_presets_by_category(callback_data.category_id)
     if not presets:
         await call.message.answer("В этой категории пока нет пресетов.")
         await call.answer()
         return
-    await call.message.answer("Выберите пресет:", reply_markup=presets_keyboard(presets))
+    await call.message.answer(
+        "Выберите пресет:",
+        reply_markup=category_presets_keyboard(callback_data.category_id),
+    )
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data.startswith("preset:"))
-async def preset_selected(call: CallbackQuery, state: FSMContext) -> None:
-    preset_id = call.data.split(":")[1]
+@router.callback_query(PresetCallback.filter())
+async def preset_selected(call: CallbackQuery, callback_data: PresetCallback, state: FSMContext) -> None:
+    preset_id = callback_data.preset_id
     preset = get_preset(preset_id)
     if not preset:
-        await call.message.answer("Пресет не найден.")
+        await call.message.answer(_PRESET_MISSING_TEXT)
         await call.answer()
         return
-    balance = _get_user_balance(call.from_user.id)
+    balance = await load_balance(get_request_session(), call.from_user.id)
     await state.update_data(preset_id=preset_id, used_new_variant=False)
     mode = preset.get("mode", "song")
     if mode == "user_lyrics":
         await state.set_state(TrackStates.waiting_for_user_lyrics_brief)
         await call.message.answer(
             f"{_preset_line(preset, balance=balance)}\n\nОтправьте одним сообщением стиль, настроение и жанр.",
-            reply_markup=main_menu(),
+            reply_markup=MAIN_MENU,
         )
     elif mode == "instrumental":
         await state.set_state(TrackStates.waiting_for_brief)
         await call.message.answer(
             f"{_preset_line(preset, balance=balance)}\n\nОпишите инструментал: настроение, темп, инструменты, где будет играть.",
-            reply_markup=main_menu(),
+            reply_markup=MAIN_MENU,
         )
     else:
         await state.set_state(TrackStates.waiting_for_brief)
         await call.message.answer(
             f"{_preset_line(preset, balance=balance)}\n\nОтправьте одним сообщением вводные для песни (brief).",
-            reply_markup=main_menu(),
+            reply_markup=MAIN_MENU,
         )
     await call.answer()
 
 
+def _create_text_task(
+    session: Session,
+    tg_id: int,
+    preset_id: str,
+    brief: str,
+    user_lyrics_raw: str | None,
+    progress_chat_id: int,
+    progress_message_id: int,
+) -> int:
+    user = get_or_create_user(session, tg_id)
+    return create_task(
+        session,
+        user_id=user.id,
+        preset_id=preset_id,
+        status=TEXT_QUEUED,
+        brief=brief,
+        user_lyrics_raw=user_lyrics_raw,
+        progress_chat_id=progress_chat_id,
+        progress_message_id=progress_message_id,
+    )
+
+
 @router.message(TrackStates.waiting_for_brief)
 async def handle_brief(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data["preset_id"])
     if not preset:
-        await message.answer("Пресет не найден. Начните заново.")
+        await message.answer(_PRESET_NOT_FOUND_TEXT)
         await state.clear()
         return
 
-    with SessionLocal() as session:
-        user = get_or_create_user(session, message.from_user.id)
-        remaining = get_free_quota_remaining(session, user)
-        balance = user.balance_rub
-        if remaining <= 0:
-            await message.answer(
-                _with_preset(preset, _paid_text_offer_message(balance)),
-                reply_markup=text_payment_keyboard(TEXT_PRICE_RUB),
-            )
-            await state.update_data(brief=message.text, pending_text_action="generate")
-            return
-        consume_free_quota(session, user)
+    remaining, balance = await run_db(reserve_free_text, message.from_user.id)
+    if remaining <= 0:
+        await set_cached_balance(message.from_user.id, balance)
+        await message.answer(
+            _with_preset(preset, _paid_text_offer_message(balance)),
+            reply_markup=TEXT_PAYMENT_KEYBOARD,
+        )
+        data.update(brief=message.text, pending_text_action="generate")
+        await state.set_data(data)
+        return
     await message.answer(_with_preset(preset, _free_text_remaining_line(remaining)))
 
-    await state.update_data(brief=message.text)
-    await _queue_text_generation(message, state, preset, message.text)
+    data.pop("brief", None)
+    await _queue_text_generation(message, state, data, preset, message.from_user.id, message.text)
 
 
 @router.message(TrackStates.waiting_for_user_lyrics_brief)
@@ -221,10 +316,11 @@ async def handle_user_lyrics_brief(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data["preset_id"])
     if not preset:
-        await message.answer("Пресет не найден. Начните заново.")
+        await message.answer(_PRESET_NOT_FOUND_TEXT)
         await state.clear()
         return
-    await state.update_data(brief=message.text)
+    data["brief"] = message.text
+    await state.set_data(data)
     await state.set_state(TrackStates.waiting_for_user_lyrics_text)
     await message.answer(_with_preset(preset, "Теперь отправьте ваш текст песни одним сообщением."))
 
@@ -233,96 +329,97 @@ async def handle_user_lyrics_brief(message: Message, state: FSMContext) -> None:
 async def handle_user_lyrics_text(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
-    if not preset:
-        await message.answer("Пресет не найден. Начните заново.")
+    brief = data.get("brief")
+    if not preset or brief is None:
+        await message.answer(_DATA_NOT_FOUND_TEXT)
         await state.clear()
         return
-    with SessionLocal() as session:
-        user = get_or_create_user(session, message.from_user.id)
-        remaining = get_free_quota_remaining(session, user)
-        balance = user.balance_rub
-        if remaining <= 0:
-            await message.answer(
-                _with_preset(preset, _paid_text_offer_message(balance)),
-                reply_markup=text_payment_keyboard(TEXT_PRICE_RUB),
-            )
-            await state.update_data(user_lyrics_raw=message.text, pending_text_action="user_lyrics")
-            return
-        consume_free_quota(session, user)
+    remaining, balance = await run_db(reserve_free_text, message.from_user.id)
+    if remaining <= 0:
+        await set_cached_balance(message.from_user.id, balance)
+        await message.answer(
+            _with_preset(preset, _paid_text_offer_message(balance)),
+            reply_markup=TEXT_PAYMENT_KEYBOARD,
+        )
+        data.update(user_lyrics_raw=message.text, pending_text_action="user_lyrics")
+        await state.set_data(data)
+        return
     await message.answer(_with_preset(preset, _free_text_remaining_line(remaining)))
-    await state.update_data(user_lyrics_raw=message.text)
-    await _queue_text_generation(message, state, preset, data.get("brief", ""), user_lyrics_raw=message.text)
+    data.pop("brief")
+    await _queue_text_generation(
+        message, state, data, preset, message.from_user.id, brief, user_lyrics_raw=message.text
+    )
 
 
-@router.callback_query(lambda call: call.data == "textpay:pay")
+@router.callback_query(F.data == "textpay:pay")
 async def paid_text_start(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     if not preset:
-        await call.message.answer("Пресет не найден. Начните заново.")
+        await call.message.answer(_PRESET_NOT_FOUND_TEXT)
         await call.answer()
         return
-    with SessionLocal() as session:
-        balance = get_balance(session, call.from_user.id)
+    balance = await load_balance(get_request_session(), call.from_user.id)
     await call.message.answer(
         _with_preset(preset, _paid_text_confirm_message(balance)),
-        reply_markup=text_payment_confirm_keyboard(),
+        reply_markup=TEXT_PAYMENT_CONFIRM_KEYBOARD,
     )
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data == "textpay:back")
+@router.callback_query(F.data == "textpay:back")
 async def paid_text_back(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     if not preset:
-        await call.message.answer("Пресет не найден. Начните заново.")
+        await call.message.answer(_PRESET_NOT_FOUND_TEXT)
         await call.answer()
         return
-    with SessionLocal() as session:
-        balance = get_balance(session, call.from_user.id)
+    balance = await load_balance(get_request_session(), call.from_user.id)
     await call.message.answer(
         _with_preset(preset, _paid_text_offer_message(balance)),
-        reply_markup=text_payment_keyboard(TEXT_PRICE_RUB),
+        reply_markup=TEXT_PAYMENT_KEYBOARD,
     )
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data == "textpay:confirm")
+@router.callback_query(F.data == "textpay:confirm")
 async def paid_text_confirm(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     pending_action = data.get("pending_text_action")
+    task_id = data.get("task_id")
     brief = data.get("brief")
-    user_lyrics_raw = data.get("user_lyrics_raw")
-    if not preset or not pending_action:
-        await call.message.answer("Данные не найдены. Начните заново.")
+    has_source = bool(task_id) if pending_action == "regen" else brief is not None
+    if not preset or not pending_action or not has_source:
+        await call.message.answer(_DATA_NOT_FOUND_TEXT)
         await call.answer()
         return
-    with SessionLocal() as session:
-        try:
-            adjust_balance(session, call.from_user.id, -TEXT_PRICE_RUB, "spend_text")
-        except InsufficientFunds:
-            current_balance = get_balance(session, call.from_user.id)
-            await call.message.answer(
-                _with_preset(preset, f"Недостаточно средств. Баланс: {current_balance} ₽.")
-            )
-            await call.answer()
-            return
-    await state.update_data(pending_text_action=None)
+    try:
+        balance = await run_db(adjust_balance, call.from_user.id, -TEXT_PRICE_RUB, "spend_text")
+    except InsufficientFunds as exc:
+        await set_cached_balance(call.from_user.id, exc.balance)
+        await call.message.answer(
+            _with_preset(preset, f"Недостаточно средств. Баланс: {exc.balance} ₽.")
+        )
+        await call.answer()
+        return
+    await set_cached_balance(call.from_user.id, balance)
     if pending_action == "regen":
-        await state.update_data(used_new_variant=True)
-        await _queue_regeneration(call.message, state, preset, data.get("brief", ""))
+        data.update(pending_text_action=None, used_new_variant=True)
+        await state.set_data(data)
+        await _queue_regeneration(call.message, preset, task_id)
     else:
-        if not brief:
-            await call.message.answer("Данные не найдены. Начните заново.")
-            await call.answer()
-            return
-        await _queue_text_generation(call.message, state, preset, brief, user_lyrics_raw=user_lyrics_raw)
+        user_lyrics_raw = data.pop("user_lyrics_raw", None)
+        data.pop("brief")
+        data["pending_text_action"] = None
+        await _queue_text_generation(
+            call.message, state, data, preset, call.from_user.id, brief, user_lyrics_raw=user_lyrics_raw
+        )
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data == "textpay:wait")
+@router.callback_query(F.data == "textpay:wait")
 async def paid_text_wait(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", "")) if data else None
@@ -332,12 +429,12 @@ async def paid_text_wait(call: CallbackQuery, state: FSMContext) -> None:
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data == "textpay:cancel")
+@router.callback_query(F.data == "textpay:cancel")
 async def paid_text_cancel(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", "")) if data else None
-    text = "Отмена. Выберите действие в меню."
-    await call.message.answer(_with_preset(preset, text) if preset else text, reply_markup=main_menu())
+    text = _CANCEL_TEXT
+    await call.message.answer(_with_preset(preset, text) if preset else text, reply_markup=MAIN_MENU)
     await state.clear()
     await call.answer()
 
@@ -345,7 +442,9 @@ async def paid_text_cancel(call: CallbackQuery, state: FSMContext) -> None:
 async def _queue_text_generation(
     message: Message,
     state: FSMContext,
+    data: dict,
     preset: dict,
+    tg_id: int,
     brief: str,
     user_lyrics_raw: str | None = None,
 ) -> None:
@@ -357,87 +456,77 @@ async def _queue_text_generation(
     else:
         status_text = "⏳ Генерирую текст…"
     status_message = await message.answer(_with_preset(preset, status_text))
-    with SessionLocal() as session:
-        user = get_or_create_user(session, message.from_user.id)
-        task = create_task(
-            session,
-            user_id=user.id,
-            preset_id=preset["id"],
-            status=TEXT_QUEUED,
-            brief=brief,
-            user_lyrics_raw=user_lyrics_raw,
-            progress_chat_id=message.chat.id,
-            progress_message_id=status_message.message_id,
-        )
-    await state.update_data(task_id=task.id, preset_id=preset["id"], brief=brief, user_lyrics_raw=user_lyrics_raw)
+    task_id = await run_db(
+        _create_text_task,
+        tg_id,
+        preset["id"],
+        brief,
+        user_lyrics_raw,
+        message.chat.id,
+        status_message.message_id,
+    )
+    data["task_id"] = task_id
+    await state.set_data(data)
     await state.set_state(TrackStates.waiting_for_review)
-    from app.worker.tasks import enqueue_text_generation
-
-    job_id = enqueue_text_generation(task.id)
+    job_id = await enqueue_text_generation(task_id)
     logger.info("Текстовая генерация поставлена в очередь: %s", job_id)
 
 
-async def _queue_regeneration(message: Message, state: FSMContext, preset: dict, brief: str) -> None:
-    data = await state.get_data()
-    task_id = data.get("task_id")
-    user_lyrics_raw = data.get("user_lyrics_raw")
-    if not task_id:
-        await message.answer("Данные не найдены. Начните заново.")
-        await state.clear()
-        return
-    await _send_or_edit_progress(message, task_id, _with_preset(preset, "⏳ Генерирую текст…"))
-    with SessionLocal() as session:
-        update_task(
-            session,
-            task_id,
-            status=TEXT_QUEUED,
-            brief=brief,
-            lyrics_current=None,
-            tags_current=None,
-            error_message=None,
-            genapi_request_id=None,
-            user_lyrics_raw=user_lyrics_raw,
-        )
-    from app.worker.tasks import enqueue_text_generation
-
-    job_id = enqueue_text_generation(task_id)
+async def _queue_regeneration(message: Message, preset: dict, task_id: int) -> None:
+    task = await run_db(
+        update_task,
+        task_id,
+        status=TEXT_QUEUED,
+        lyrics_current=None,
+        tags_current=None,
+        error_message=None,
+        genapi_request_id=None,
+    )
+    await _send_or_edit_progress(
+        message,
+        task_id,
+        _with_preset(preset, "⏳ Генерирую текст…"),
+        status_message_id=task.progress_message_id if task else None,
+    )
+    job_id = await enqueue_text_generation(task_id)
     logger.info("Повторная генерация поставлена в очередь: %s", job_id)
 
 
-@router.callback_query(lambda call: call.data.startswith("review:"))
-async def review_actions(call: CallbackQuery, state: FSMContext) -> None:
-    action = call.data.split(":")[1]
+@router.callback_query(ReviewCallback.filter())
+async def review_actions(call: CallbackQuery, callback_data: ReviewCallback, state: FSMContext) -> None:
+    action = callback_data.action
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     if not preset:
-        await call.message.answer("Пресет не найден. Начните заново.")
+        await call.message.answer(_PRESET_NOT_FOUND_TEXT)
         await state.clear()
         await call.answer()
         return
 
     if action == "approve":
         task_id = data.get("task_id")
+        task = None
         if task_id:
-            with SessionLocal() as session:
-                update_task(session, task_id, status=TITLE_WAITING)
+            task = await run_db(update_task, task_id, status=TITLE_WAITING)
         await state.set_state(TrackStates.waiting_for_title)
         if task_id:
             await _send_or_edit_progress(
                 call.message,
                 task_id,
-                f"{_preset_line(preset)}\n\n🎼 Введите название трека или нажмите 🎲 Автоназвание",
-                reply_markup=title_keyboard(),
+                _preset_line(preset) + _TITLE_PROMPT_SUFFIX,
+                reply_markup=TITLE_KEYBOARD,
+                status_message_id=task.progress_message_id if task else None,
+                wait=False,
             )
         else:
             await call.message.answer(
-                f"{_preset_line(preset)}\n\n🎼 Введите название трека или нажмите 🎲 Автоназвание",
-                reply_markup=title_keyboard(),
+                _preset_line(preset) + _TITLE_PROMPT_SUFFIX,
+                reply_markup=TITLE_KEYBOARD,
             )
     elif action == "edit":
         task_id = data.get("task_id")
         if task_id:
-            with SessionLocal() as session:
-                update_task(session, task_id, status=WAITING_EDIT_REQUEST)
+            await run_db(update_task, task_id, status=WAITING_EDIT_REQUEST)
         await state.set_state(TrackStates.waiting_for_edit)
         await call.message.answer(f"{_preset_line(preset)}\n\nНапишите, что поправить в тексте.")
     elif action == "regen":
@@ -445,65 +534,73 @@ async def review_actions(call: CallbackQuery, state: FSMContext) -> None:
             await call.message.answer(_with_preset(preset, "Новый вариант уже был использован."))
             await call.answer()
             return
-        with SessionLocal() as session:
-            user = get_or_create_user(session, call.from_user.id)
-            remaining = get_free_quota_remaining(session, user)
-            balance = user.balance_rub
-            if remaining <= 0:
-                await call.message.answer(
-                    _with_preset(preset, _paid_text_offer_message(balance)),
-                    reply_markup=text_payment_keyboard(TEXT_PRICE_RUB),
-                )
-                await state.update_data(pending_text_action="regen")
-                await call.answer()
-                return
-            consume_free_quota(session, user)
+        remaining, balance = await run_db(reserve_free_text, call.from_user.id)
+        if remaining <= 0:
+            await set_cached_balance(call.from_user.id, balance)
+            await call.message.answer(
+                _with_preset(preset, _paid_text_offer_message(balance)),
+                reply_markup=TEXT_PAYMENT_KEYBOARD,
+            )
+            data["pending_text_action"] = "regen"
+            await state.set_data(data)
+            await call.answer()
+            return
         await call.message.answer(_with_preset(preset, _free_text_remaining_line(remaining)))
-        brief = data.get("brief", "")
-        await state.update_data(used_new_variant=True)
-        await _queue_regeneration(call.message, state, preset, brief)
+        task_id = data.get("task_id")
+        if not task_id:
+            await call.message.answer(_DATA_NOT_FOUND_TEXT)
+            await state.clear()
+            await call.answer()
+            return
+        data["used_new_variant"] = True
+        await state.set_data(data)
+        await _queue_regeneration(call.message, preset, task_id)
     elif action == "cancel":
         task_id = data.get("task_id")
         if task_id:
-            with SessionLocal() as session:
-                update_task(session, task_id, status=CANCELED)
+            await run_db(update_task, task_id, status=CANCELED)
         await state.clear()
-        await call.message.answer("Отмена. Выберите действие в меню.", reply_markup=main_menu())
+        await call.message.answer(_CANCEL_TEXT, reply_markup=MAIN_MENU)
     await call.answer()
 
 
+def _restore_review(session: Session, task_id: int, tg_id: int) -> tuple[str | None, str | None, int, int]:
+    task = session.get(Task, task_id)
+    if task:
+        task.status = REVIEW_READY
+        task.edit_request = None
+    user = get_or_create_user(session, tg_id)
+    remaining = get_free_quota_remaining(user)
+    session.commit()
+    lyrics = task.lyrics_current if task else None
+    tags = task.tags_current if task else None
+    return lyrics, tags, remaining, user.balance_rub
+
+
 @router.message(TrackStates.waiting_for_edit)
 async def handle_edit(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     task_id = data.get("task_id")
     if not preset or not task_id:
-        await message.answer("Данные не найдены. Начните заново.")
+        await message.answer(_DATA_NOT_FOUND_TEXT)
         await state.clear()
         return
     if _is_edit_cancel(message.text):
-        with SessionLocal() as session:
-            task = get_task(session, task_id)
-            lyrics = task.lyrics_current if task else None
-            tags = task.tags_current if task else None
-            update_task(session, task_id, status=REVIEW_READY, edit_request=None)
-            balance = get_balance(session, message.from_user.id)
+        lyrics, tags, remaining, balance = await run_db(
+            _restore_review, task_id, message.from_user.id
+        )
         if not lyrics or not tags:
-            await message.answer("Нет данных для ревью. Начните заново.")
+            await message.answer(_REVIEW_DATA_NOT_FOUND_TEXT)
             await state.clear()
             return
-        from app.bot.keyboards.inline import review_keyboard
-
         mode = preset.get("mode", "song")
-        status_prefix = f"🎛 Пресет: {preset['title']}"
+        status_prefix = preset["title_line"]
         if mode == "instrumental":
             body = f"Описание инструментала:\n\n{lyrics}"
         else:
             body = f"Текст песни:\n\n{lyrics}"
         price = preset.get("price_audio_rub", 0)
-        with SessionLocal() as session:
-            user = get_or_create_user(session, message.from_user.id)
-            remaining = get_free_quota_remaining(session, user)
         await message.answer(
             text=(
                 "Ок, оставляем как есть ✅\n\n"
@@ -511,43 +608,45 @@ async def handle_edit(message: Message, state: FSMContext) -> None:
                 f"{_free_text_remaining_line(remaining)}\n"
                 f"Цена аудио: {price} ₽ | Баланс: {balance} ₽"
             ),
-            reply_markup=review_keyboard(),
+            reply_markup=REVIEW_KEYBOARD,
         )
         await state.set_state(TrackStates.waiting_for_review)
         return
-    await _send_or_edit_progress(message, task_id, _with_preset(preset, "⏳ Применяю правки…"))
-    with SessionLocal() as session:
-        update_task(
-            session,
-            task_id,
-            status=EDIT_QUEUED,
-            edit_request=message.text,
-        )
+    task = await run_db(
+        update_task,
+        task_id,
+        status=EDIT_QUEUED,
+        edit_request=message.text,
+    )
+    await _send_or_edit_progress(
+        message,
+        task_id,
+        _with_preset(preset, "⏳ Применяю правки…"),
+        status_message_id=task.progress_message_id if task else None,
+    )
     await state.set_state(TrackStates.waiting_for_review)
-    from app.worker.tasks import enqueue_edit_generation
-
-    job_id = enqueue_edit_generation(task_id)
+    job_id = await enqueue_edit_generation(task_id)
     logger.info("Правка поставлена в очередь: %s", job_id)
 
 
-@router.callback_query(lambda call: call.data == "title:auto")
+@router.callback_query(F.data == "title:auto")
 async def handle_auto_title(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     if not preset:
-        await call.message.answer("Пресет не найден.")
+        await call.message.answer(_PRESET_MISSING_TEXT)
         await call.answer()
         return
-    brief = data.get("brief", "")
     task_id = data.get("task_id")
     suggested_title = None
+    brief = ""
     if task_id:
-        with SessionLocal() as session:
-            task = get_task(session, task_id)
-            suggested_title = task.suggested_title if task else None
+        task = await run_db(get_task, task_id)
+        if task:
+            suggested_title = task.suggested_title
+            brief = task.brief or ""
     title = sanitize_title(suggested_title) if suggested_title else build_auto_title(preset["title"], brief)
-    await state.update_data(title=title)
-    await _finalize_track(call.message, state, preset, title)
+    await _finalize_track(call.message, state, data, preset, title)
     await call.answer()
 
 
@@ -559,34 +658,37 @@ async def handle_title(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     if not preset:
-        await message.answer("Пресет не найден.")
+        await message.answer(_PRESET_MISSING_TEXT)
         await state.clear()
         return
-    title = sanitize_title(message.text)
-    await state.update_data(title=title)
-    await _finalize_track(message, state, preset, title)
+    title = message.text.strip()
+    await _finalize_track(message, state, data, preset, title)
 
 
-async def _finalize_track(message: Message, state: FSMContext, preset: dict, title: str) -> None:
-    data = await state.get_data()
+async def _finalize_track(
+    message: Message,
+    state: FSMContext,
+    data: dict,
+    preset: dict,
+    title: str,
+) -> None:
     task_id = data.get("task_id")
     if not task_id:
-        await message.answer("Нет данных для генерации. Начните заново.")
+        await message.answer(_GENERATION_DATA_NOT_FOUND_TEXT)
         await state.clear()
         return
-    with SessionLocal() as session:
-        task = get_task(session, task_id)
-        lyrics = task.lyrics_current if task else None
-        tags = task.tags_current if task else None
-        update_task(session, task_id, status=TITLE_WAITING, title_text=title)
+    session = get_request_session()
+    task = await run_db(update_task, task_id, status=TITLE_WAITING, title_text=title)
+    lyrics = task.lyrics_current if task else None
+    tags = task.tags_current if task else None
     if not lyrics or not tags:
-        await message.answer("Нет данных для генерации. Начните заново.")
+        await message.answer(_GENERATION_DATA_NOT_FOUND_TEXT)
         await state.clear()
         return
     amount = preset["price_audio_rub"]
-    with SessionLocal() as session:
-        balance = get_balance(session, message.from_user.id)
-    await state.update_data(pending_audio_amount=amount)
+    balance = await load_balance(session, message.from_user.id)
+    data.update(title=title, pending_audio_amount=amount)
+    await state.set_data(data)
     await state.set_state(TrackStates.waiting_for_audio_confirm)
     status_text = (
         f"{_preset_line(preset, balance=balance)}\n"
@@ -597,84 +699,95 @@ async def _finalize_track(message: Message, state: FSMContext, preset: dict, tit
         message,
         task_id,
         status_text,
-        reply_markup=audio_payment_confirm_keyboard(),
+        reply_markup=AUDIO_PAYMENT_CONFIRM_KEYBOARD,
+        status_message_id=task.progress_message_id,
+        wait=False,
     )
 
 
-@router.callback_query(lambda call: call.data == "audiopay:confirm")
+def _charge_audio(session: Session, task_id: int, tg_id: int, amount: int) -> tuple[str, int, str | None]:
+    result = charge_task(
+        session.connection(),
+        task_id,
+        tg_id,
+        amount,
+        "spend_audio",
+        paid_status=AUDIO_QUEUED,
+        unpaid_status=PAYMENT_WAITING,
+        payable_statuses=(TITLE_WAITING, PAYMENT_WAITING),
+    )
+    session.commit()
+    return result
+
+
+@router.callback_query(F.data == "audiopay:confirm")
 async def audio_payment_confirm(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     task_id = data.get("task_id")
     amount = data.get("pending_audio_amount")
     if not preset or not task_id or amount is None:
-        await call.message.answer("Данные не найдены. Начните заново.")
+        await call.message.answer(_DATA_NOT_FOUND_TEXT)
+        await call.answer()
+        return
+    outcome, balance, task_title = await run_db(
+        _charge_audio, task_id, call.from_user.id, amount
+    )
+    if outcome == CHARGE_NOT_PAYABLE:
+        await call.answer(_AUDIO_ALREADY_PAID_TEXT)
+        return
+    await set_cached_balance(call.from_user.id, balance)
+    title_text = data.get("title") or task_title
+    if outcome == CHARGE_INSUFFICIENT:
+        await _send_or_edit_progress(
+            call.message,
+            task_id,
+            (
+                f"{_preset_line(preset, balance=balance)}\n"
+                f"{_title_line(title_text)}\n"
+                f"Недостаточно средств для аудио. Цена: {amount} ₽."
+            ),
+            wait=False,
+        )
+        await state.clear()
         await call.answer()
         return
-    title_text = data.get("title")
-    with SessionLocal() as session:
-        task = get_task(session, task_id)
-        title_text = title_text or (task.title_text if task else None)
-        balance_before = get_balance(session, call.from_user.id)
-        try:
-            balance_after = adjust_balance(session, call.from_user.id, -amount, "spend_audio", task_id=task_id)
-        except InsufficientFunds:
-            current_balance = get_balance(session, call.from_user.id)
-            update_task(session, task_id, status=PAYMENT_WAITING)
-            await _send_or_edit_progress(
-                call.message,
-                task_id,
-                (
-                    f"{_preset_line(preset, balance=current_balance)}\n"
-                    f"{_title_line(title_text)}\n"
-                    f"Недостаточно средств для аудио. Цена: {amount} ₽."
-                ),
-            )
-            await state.clear()
-            await call.answer()
-            return
     logger.info(
         "Списан баланс за аудио",
         extra={
             "task_id": task_id,
             "user_id": call.from_user.id,
-            "balance_before": balance_before,
+            "balance_before": balance + amount,
             "price": amount,
-            "balance_after": balance_after,
+            "balance_after": balance,
         },
     )
-    status_message_id = await _send_or_edit_progress(
-        call.message,
-        task_id,
-        f"{_preset_line(preset)}\n{_title_line(title_text)}\n⏳ Генерирую аудио…",
-        reply_markup=None,
+    status_message_id, _ = await asyncio.gather(
+        _send_or_edit_progress(
+            call.message,
+            task_id,
+            f"{_preset_line(preset)}\n{_title_line(title_text)}\n⏳ Генерирую аудио…",
+            reply_markup=None,
+        ),
+        state.clear(),
     )
-    await state.clear()
-    from app.worker.tasks import enqueue_audio_generation
-
-    job_id = enqueue_audio_generation(
-        task_id=task_id,
-        chat_id=call.message.chat.id,
-        status_message_id=status_message_id,
+    job_id, _ = await asyncio.gather(
+        enqueue_audio_generation(
+            task_id=task_id,
+            chat_id=call.message.chat.id,
+            status_message_id=status_message_id,
+        ),
+        call.answer(),
     )
-    with SessionLocal() as session:
-        update_task(
-            session,
-            task_id,
-            status=AUDIO_QUEUED,
-            progress_chat_id=call.message.chat.id,
-            progress_message_id=status_message_id,
-        )
     logger.info("Трек поставлен в очередь: %s", job_id)
-    await call.answer()
 
 
-@router.callback_query(lambda call: call.data == "audiopay:back")
+@router.callback_query(F.data == "audiopay:back")
 async def audio_payment_back(call: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     preset = get_preset(data.get("preset_id", ""))
     if not preset:
-        await call.message.answer("Пресет не найден. Начните заново.")
+        await call.message.answer(_PRESET_NOT_FOUND_TEXT)
         await call.answer()
         return
     await state.set_state(TrackStates.waiting_for_title)
@@ -683,21 +796,19 @@ async def audio_payment_back(call: CallbackQuery, state: FSMContext) -> None:
         await _send_or_edit_progress(
             call.message,
             task_id,
-            f"{_preset_line(preset)}\n\n🎼 Введите название трека или нажмите 🎲 Автоназвание",
-            reply_markup=title_keyboard(),
+            _preset_line(preset) + _TITLE_PROMPT_SUFFIX,
+            reply_markup=TITLE_KEYBOARD,
+            wait=False,
         )
     else:
         await call.message.answer(
-            f"{_preset_line(preset)}\n\n🎼 Введите название трека или нажмите 🎲 Автоназвание",
-            reply_markup=title_keyboard(),
+            _preset_line(preset) + _TITLE_PROMPT_SUFFIX,
+            reply_markup=TITLE_KEYBOARD,
         )
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data.startswith("track:second:"))
-async def send_second_variant(call: CallbackQuery) -> None:
-    from app.worker.tasks import deliver_second_variant
-
-    track_id = int(call.data.split(":")[2])
-    await deliver_second_variant(track_id, call.message.chat.id)
+@router.callback_query(TrackCallback.filter(F.action == "second"))
+async def send_second_variant(call: CallbackQuery, callback_data: TrackCallback) -> None:
+    await deliver_second_variant(callback_data.track_id, call.message.chat.id)
     await call.answer()
@@ -1,10 +1,10 @@
-from aiogram import Router
+from aiogram import F, Router
 from aiogram.types import Message
 
 router = Router()
 
 
-@router.message(lambda message: message.text == "❓ Помощь")
+@router.message(F.text == "❓ Помощь")
 async def show_help(message: Message) -> None:
     await message.answer(
         "Я помогу создать текст песни и сгенерировать аудио.\n"
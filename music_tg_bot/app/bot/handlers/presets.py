@@ -1,42 +1,41 @@
-from aiogram import Router
+from aiogram import F, Router
 from aiogram.types import Message, CallbackQuery
 
+from app.bot.callbacks import PresetCategoryCallback, PresetInfoCallback
 from app.bot.keyboards.inline import (
-    categories_keyboard,
+    category_list_keyboard,
+    category_presets_info_keyboard,
     presets_info_keyboard,
-    presets_info_list_keyboard,
 )
-from app.core.db import SessionLocal
-from app.core.repo import get_or_create_user
-from app.presets.loader import load_categories, get_presets_by_category, get_preset
+from app.core.cache import load_balance
+from app.core.db import get_request_session
+from app.presets.loader import get_presets_by_category, get_preset
 
 router = Router()
 
 
-@router.message(lambda message: message.text == "⭐ Пресеты")
+@router.message(F.text == "⭐ Пресеты")
 async def show_presets(message: Message) -> None:
-    categories = load_categories()
     await message.answer(
         "Выберите категорию:",
-        reply_markup=categories_keyboard(categories, prefix="preset_category"),
+        reply_markup=category_list_keyboard(PresetCategoryCallback),
     )
 
 
-@router.callback_query(lambda call: call.data.startswith("preset_category:"))
-async def show_presets_by_category(call: CallbackQuery) -> None:
-    category_id = call.data.split(":")[1]
-    presets = get_presets_by_category(category_id)
+@router.callback_query(PresetCategoryCallback.filter())
+async def show_presets_by_category(call: CallbackQuery, callback_data: PresetCategoryCallback) -> None:
+    presets = get_presets_by_category(callback_data.category_id)
     if not presets:
         await call.message.answer("В этой категории пока нет пресетов.")
         await call.answer()
         return
-    await call.message.answer("Выберите пресет:", reply_markup=presets_info_list_keyboard(presets))
+    await call.message.answer("Выберите пресет:", reply_markup=category_presets_info_keyboard(callback_data.category_id))
     await call.answer()
 
 
-@router.callback_query(lambda call: call.data.startswith("presetinfo:"))
-async def show_preset_info(call: CallbackQuery) -> None:
-    preset_id = call.data.split(":")[1]
+@router.callback_query(PresetInfoCallback.filter())
+async def show_preset_info(call: CallbackQuery, callback_data: PresetInfoCallback) -> None:
+    preset_id = callback_data.preset_id
     preset = get_preset(preset_id)
     if not preset:
         await call.message.answer("Пресет не найден.")
@@ -44,11 +43,9 @@ async def show_preset_info(call: CallbackQuery) -> None:
         return
     description = preset.get("description", "")
     price = preset.get("price_audio_rub", 0)
-    with SessionLocal() as session:
-        user = get_or_create_user(session, call.from_user.id)
-        balance = user.balance_rub
+    balance = await load_balance(get_request_session(), call.from_user.id)
     await call.message.answer(
-        f"🎛 Пресет: {preset['title']}\n{description}\nЦена аудио: {price} ₽\nБаланс: {balance} ₽",
+        f"{preset['title_line']}\n{description}\nЦена аудио: {price} ₽\nБаланс: {balance} ₽",
         reply_markup=presets_info_keyboard(preset_id),
     )
     await call.answer()
@@ -1,24 +1,39 @@
 from aiogram import Router
 from aiogram.filters import CommandStart
 from aiogram.types import Message
+from sqlalchemy.orm import Session
 
-from app.bot.keyboards.reply import main_menu
-from app.core.db import SessionLocal
-from app.core.repo import apply_welcome_bonus, get_or_create_user
+from app.bot.keyboards.reply import MAIN_MENU
+from app.core.cache import forget_user_known, invalidate_balance, mark_user_known
+from app.core.db import run_db
+from app.core.repo import grant_welcome_bonus
 
 router = Router()
 
 
+def _grant_welcome_bonus(session: Session, tg_id: int, amount_rub: int) -> bool:
+    granted = grant_welcome_bonus(session.connection(), tg_id, amount_rub)
+    session.commit()
+    return granted
+
+
 @router.message(CommandStart())
 async def cmd_start(message: Message) -> None:
     welcome_bonus_rub = 79
-    with SessionLocal() as session:
-        user = get_or_create_user(session, message.from_user.id)
-        bonus_message = ""
-        granted = apply_welcome_bonus(session, user, welcome_bonus_rub)
-        if granted:
-            bonus_message = f"\n\n🎁 Стартовый бонус: {welcome_bonus_rub} ₽ — хватит на 1 трек."
+    bonus_message = ""
+    granted = False
+    if await mark_user_known(message.from_user.id):
+        try:
+            granted = await run_db(
+                _grant_welcome_bonus, message.from_user.id, welcome_bonus_rub
+            )
+        except Exception:
+            await forget_user_known(message.from_user.id)
+            raise
+    if granted:
+        bonus_message = f"\n\n🎁 Стартовый бонус: {welcome_bonus_rub} ₽ — хватит на 1 трек."
+        await invalidate_balance(message.from_user.id)
     await message.answer(
         f"Привет! Я помогу создать трек. Выбери действие в меню ниже.{bonus_message}",
-        reply_markup=main_menu(),
+        reply_markup=MAIN_MENU,
     )
@@ -1,11 +1,30 @@
 from __future__ import annotations
 
+from functools import lru_cache
+
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from app.bot.callbacks import (
+    PresetCallback,
+    PresetInfoCallback,
+    ReviewCallback,
+    TopupCallback,
+    TrackCallback,
+)
+from app.presets.loader import get_presets_by_category, load_categories
+
+_KEYBOARD_CACHE_SIZE = 256
+
 
-def categories_keyboard(categories: list[dict], prefix: str = "category") -> InlineKeyboardMarkup:
+def categories_keyboard(categories: list[dict], callback_factory: type[CallbackData]) -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton(text=category["title"], callback_data=f"{prefix}:{category['id']}")]
+        [
+            InlineKeyboardButton(
+                text=category["title"],
+                callback_data=callback_factory(category_id=category["id"]).pack(),
+            )
+        ]
         for category in categories
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -16,7 +35,7 @@ def presets_keyboard(presets: list[dict]) -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton(
                 text=f"{preset['title']} — {preset['price_audio_rub']} ₽",
-                callback_data=f"preset:{preset['id']}",
+                callback_data=PresetCallback(preset_id=preset["id"]).pack(),
             )
         ]
         for preset in presets
@@ -24,15 +43,31 @@ def presets_keyboard(presets: list[dict]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
+def category_list_keyboard(callback_factory: type[CallbackData]) -> InlineKeyboardMarkup:
+    return categories_keyboard(load_categories(), callback_factory)
+
+
+@lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
+def category_presets_keyboard(category_id: str) -> InlineKeyboardMarkup:
+    return presets_keyboard(get_presets_by_category(category_id))
+
+
+@lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
+def category_presets_info_keyboard(category_id: str) -> InlineKeyboardMarkup:
+    return presets_info_list_keyboard(get_presets_by_category(category_id))
+
+
+@lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
 def presets_info_keyboard(preset_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="Выбрать пресет", callback_data=f"preset:{preset_id}")]]
+        inline_keyboard=[[InlineKeyboardButton(text="Выбрать пресет", callback_data=PresetCallback(preset_id=preset_id).pack())]]
     )
 
 
 def presets_info_list_keyboard(presets: list[dict]) -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton(text=f"{preset['title']} — {preset['price_audio_rub']} ₽", callback_data=f"presetinfo:{preset['id']}")]
+        [InlineKeyboardButton(text=f"{preset['title']} — {preset['price_audio_rub']} ₽", callback_data=PresetInfoCallback(preset_id=preset["id"]).pack())]
         for preset in presets
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -41,14 +76,17 @@ def presets_info_list_keyboard(presets: list[dict]) -> InlineKeyboardMarkup:
 def review_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Утвердить", callback_data="review:approve")],
-            [InlineKeyboardButton(text="✏️ Правка", callback_data="review:edit")],
-            [InlineKeyboardButton(text="🎲 Новый вариант", callback_data="review:regen")],
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="review:cancel")],
+            [InlineKeyboardButton(text="✅ Утвердить", callback_data=ReviewCallback(action="approve").pack())],
+            [InlineKeyboardButton(text="✏️ Правка", callback_data=ReviewCallback(action="edit").pack())],
+            [InlineKeyboardButton(text="🎲 Новый вариант", callback_data=ReviewCallback(action="regen").pack())],
+            [InlineKeyboardButton(text="❌ Отмена", callback_data=ReviewCallback(action="cancel").pack())],
         ]
     )
 
 
+REVIEW_KEYBOARD = review_keyboard()
+
+
 def text_payment_keyboard(price_rub: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -68,6 +106,9 @@ def text_payment_confirm_keyboard() -> InlineKeyboardMarkup:
     )
 
 
+TEXT_PAYMENT_CONFIRM_KEYBOARD = text_payment_confirm_keyboard()
+
+
 def audio_payment_confirm_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -77,24 +118,33 @@ def audio_payment_confirm_keyboard() -> InlineKeyboardMarkup:
     )
 
 
+AUDIO_PAYMENT_CONFIRM_KEYBOARD = audio_payment_confirm_keyboard()
+
+
 def title_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="🎲 Автоназвание", callback_data="title:auto")]]
     )
 
 
+TITLE_KEYBOARD = title_keyboard()
+
+
 def balance_keyboard() -> InlineKeyboardMarkup:
     options = [99, 199, 499, 999]
     buttons = [
-        [InlineKeyboardButton(text=f"Пополнить {amount} ₽", callback_data=f"topup:{amount}")]
+        [InlineKeyboardButton(text=f"Пополнить {amount} ₽", callback_data=TopupCallback(amount=amount).pack())]
         for amount in options
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+BALANCE_KEYBOARD = balance_keyboard()
+
+
 def second_variant_keyboard(track_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="🎧 Второй вариант", callback_data=f"track:second:{track_id}")]
+            [InlineKeyboardButton(text="🎧 Второй вариант", callback_data=TrackCallback(action="second", track_id=track_id).pack())]
         ]
     )
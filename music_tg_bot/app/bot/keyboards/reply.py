@@ -10,3 +10,6 @@ def main_menu() -> ReplyKeyboardMarkup:
         ],
         resize_keyboard=True,
     )
+
+
+MAIN_MENU = main_menu()
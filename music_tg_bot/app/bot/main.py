@@ -3,30 +3,72 @@ import logging
 
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
-import redis.asyncio as redis
+import orjson
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from app.core.cache import create_redis_client
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.bot.middlewares import (
+    CallbackDedupMiddleware,
+    ChatOrderingMiddleware,
+    DbSessionMiddleware,
+    SendRateLimitMiddleware,
+)
 from app.bot.router import setup_router
+from app.integrations import yookassa
+from app.presets.loader import load_presets
 
+FSM_TTL_SECONDS = 24 * 3600
 
-async def main() -> None:
-    setup_logging()
-    logger = logging.getLogger("bot")
+
+def create_bot() -> Bot:
     if not settings.bot_token:
-        logger.error("Не задан BOT_TOKEN")
+        logging.getLogger("bot").error("Не задан BOT_TOKEN")
         raise RuntimeError("BOT_TOKEN отсутствует")
+    bot = Bot(token=settings.bot_token)
+    bot.session.middleware(SendRateLimitMiddleware())
+    return bot
 
-    redis_client = redis.from_url(settings.redis_url)
-    storage = RedisStorage(redis_client)
 
-    bot = Bot(token=settings.bot_token)
+def create_dispatcher() -> Dispatcher:
+    storage = RedisStorage(
+        create_redis_client(),
+        state_ttl=FSM_TTL_SECONDS,
+        data_ttl=FSM_TTL_SECONDS,
+        json_loads=orjson.loads,
+        json_dumps=orjson.dumps,
+    )
+
+    load_presets()
     dispatcher = Dispatcher(storage=storage)
+    dispatcher.update.outer_middleware(ChatOrderingMiddleware())
+    dispatcher.update.outer_middleware(DbSessionMiddleware())
+    dispatcher.callback_query.outer_middleware(CallbackDedupMiddleware())
     dispatcher.include_router(setup_router())
+    dispatcher.shutdown.register(yookassa.close_client)
+    return dispatcher
+
+
+async def main() -> None:
+    setup_logging()
+    logger = logging.getLogger("bot")
+    if settings.bot_mode == "webhook":
+        logger.info("Бот работает в режиме webhook через API, polling не запускается")
+        return
+
+    bot = create_bot()
+    dispatcher = create_dispatcher()
 
     logger.info("Бот запущен")
     await dispatcher.start_polling(bot)
 
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(main())
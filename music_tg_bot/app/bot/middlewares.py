@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import CallbackQuery, TelegramObject
+from redis.exceptions import RedisError
+
+from app.core.cache import redis_client
+from app.core.db import close_request_session, open_request_session
+
+logger = logging.getLogger("bot.middlewares")
+
+UPDATE_CONCURRENCY = 25
+CALLBACK_DEDUP_SECONDS = 3
+GLOBAL_SEND_RATE = 30
+CHAT_SEND_RATE = 1
+CHAT_SEND_BURST = 3
+_CHAT_BUCKETS_LIMIT = 10_000
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        token = open_request_session()
+        try:
+            return await handler(event, data)
+        finally:
+            await close_request_session(token)
+
+
+class ChatOrderingMiddleware(BaseMiddleware):
+    def __init__(self, limit: int = UPDATE_CONCURRENCY) -> None:
+        self._semaphore = asyncio.Semaphore(limit)
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._holders: dict[int, int] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        if chat is None:
+            async with self._semaphore:
+                return await handler(event, data)
+        chat_id = chat.id
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._holders[chat_id] = self._holders.get(chat_id, 0) + 1
+        try:
+            async with lock, self._semaphore:
+                return await handler(event, data)
+        finally:
+            self._holders[chat_id] -= 1
+            if not self._holders[chat_id]:
+                del self._holders[chat_id]
+                del self._locks[chat_id]
+
+
+class CallbackDedupMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: dict[str, Any],
+    ) -> Any:
+        key = f"cbdedup:{event.from_user.id}:{event.data}"
+        try:
+            first = await redis_client.set(key, 1, nx=True, ex=CALLBACK_DEDUP_SECONDS)
+        except RedisError as exc:
+            logger.warning("Не удалось проверить повторное нажатие: %s", exc)
+            first = True
+        if not first:
+            await event.answer()
+            return None
+        return await handler(event, data)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if self._updated_at is not None:
+                    elapsed = now - self._updated_at
+                    self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendRateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self) -> None:
+        self._global = TokenBucket(GLOBAL_SEND_RATE, GLOBAL_SEND_RATE)
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(CHAT_SEND_RATE, CHAT_SEND_BURST)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > _CHAT_BUCKETS_LIMIT:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+        return await make_request(bot, method)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import logging
+
+import redis.asyncio as redis
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import run_in_session
+from app.core.repo import get_balance
+
+logger = logging.getLogger("cache")
+
+BALANCE_TTL_SECONDS = 30
+KNOWN_USER_TTL_SECONDS = 24 * 3600
+REDIS_MAX_CONNECTIONS = 50
+REDIS_TIMEOUT_SECONDS = 5
+
+
+def create_redis_client() -> redis.Redis:
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_TIMEOUT_SECONDS,
+        socket_keepalive=True,
+        socket_timeout=REDIS_TIMEOUT_SECONDS,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+redis_client = create_redis_client()
+sync_redis_client = Redis.from_url(settings.redis_url, socket_timeout=REDIS_TIMEOUT_SECONDS)
+
+
+def balance_cache_key(tg_id: int) -> str:
+    return f"bal:{tg_id}"
+
+
+async def get_cached_balance(tg_id: int) -> int | None:
+    try:
+        value = await redis_client.get(balance_cache_key(tg_id))
+    except RedisError as exc:
+        logger.warning("Кэш баланса недоступен: %s", exc)
+        return None
+    return int(value) if value is not None else None
+
+
+async def set_cached_balance(tg_id: int, balance: int) -> None:
+    try:
+        await redis_client.setex(balance_cache_key(tg_id), BALANCE_TTL_SECONDS, balance)
+    except RedisError as exc:
+        logger.warning("Кэш баланса недоступен: %s", exc)
+
+
+async def invalidate_balance(tg_id: int) -> None:
+    try:
+        await redis_client.delete(balance_cache_key(tg_id))
+    except RedisError as exc:
+        logger.warning("Кэш баланса недоступен: %s", exc)
+
+
+async def mark_user_known(tg_id: int) -> bool:
+    try:
+        return bool(await redis_client.set(f"u:{tg_id}", 1, nx=True, ex=KNOWN_USER_TTL_SECONDS))
+    except RedisError as exc:
+        logger.warning("Кэш пользователей недоступен: %s", exc)
+        return True
+
+
+async def forget_user_known(tg_id: int) -> None:
+    try:
+        await redis_client.delete(f"u:{tg_id}")
+    except RedisError as exc:
+        logger.warning("Кэш пользователей недоступен: %s", exc)
+
+
+def invalidate_balance_sync(tg_id: int) -> None:
+    try:
+        sync_redis_client.delete(balance_cache_key(tg_id))
+    except RedisError as exc:
+        logger.warning("Кэш баланса недоступен: %s", exc)
+
+
+async def load_balance(session: AsyncSession, tg_id: int) -> int:
+    balance = await get_cached_balance(tg_id)
+    if balance is None:
+        balance = await run_in_session(session, get_balance, tg_id)
+        await set_cached_balance(tg_id, balance)
+    return balance
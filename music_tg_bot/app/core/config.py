@@ -26,6 +26,8 @@ class Settings:
     storage_dir: Path
     environment: str
     admin_ids: list[int]
+    bot_mode: str
+    telegram_webhook_secret: Optional[str]
 
 
 def _parse_admin_ids(raw_value: str | None) -> list[int]:
@@ -67,6 +69,8 @@ def load_settings() -> Settings:
         storage_dir=storage_dir,
         environment=os.environ.get("ENVIRONMENT", "production"),
         admin_ids=_parse_admin_ids(os.environ.get("ADMIN_IDS", "")),
+        bot_mode=os.environ.get("BOT_MODE", "polling").strip().lower(),
+        telegram_webhook_secret=os.environ.get("TELEGRAM_WEBHOOK_SECRET", "").strip() or None,
     )
 
 
@@ -1,14 +1,97 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+import logging
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from app.core.config import settings
 
+logger = logging.getLogger("db")
+
+T = TypeVar("T")
+
+SLOW_CHECKOUT_SECONDS = 5.0
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def _async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    return url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
 engine = create_engine(settings.database_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+async_engine = create_async_engine(
+    _async_database_url(settings.database_url),
+    pool_size=25,
+    max_overflow=25,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    pool_timeout=30,
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+@event.listens_for(async_engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    connection_record.info["checked_out_at"] = time.monotonic()
+
+
+@event.listens_for(async_engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record) -> None:
+    checked_out_at = connection_record.info.pop("checked_out_at", None)
+    if checked_out_at is None:
+        return
+    held = time.monotonic() - checked_out_at
+    if held > SLOW_CHECKOUT_SECONDS:
+        logger.warning("Соединение с БД удерживалось %.1f с", held)
+
+
+_request_session: ContextVar[AsyncSession | None] = ContextVar("_request_session", default=None)
+
+
+def open_request_session() -> Token[AsyncSession | None]:
+    return _request_session.set(AsyncSessionLocal())
+
+
+def get_request_session() -> AsyncSession:
+    session = _request_session.get()
+    if session is None:
+        raise RuntimeError("Сессия БД не открыта для текущего запроса")
+    return session
+
+
+async def close_request_session(token: Token[AsyncSession | None]) -> None:
+    session = _request_session.get()
+    _request_session.reset(token)
+    if session is not None:
+        await session.close()
+
+
+async def run_in_session(session: AsyncSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    try:
+        result = await session.run_sync(fn, *args, **kwargs)
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        raise
+    return result
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await run_in_session(get_request_session(), fn, *args, **kwargs)
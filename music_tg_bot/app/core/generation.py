@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 
 
 PROMPTS_DIR = Path(__file__).resolve().parents[1] / "presets" / "prompts"
 
 
+@lru_cache(maxsize=None)
 def _load_prompt(name: str) -> str:
     return (PROMPTS_DIR / name).read_text(encoding="utf-8")
 
@@ -21,8 +23,8 @@ def _render_template(template: str, **kwargs: str) -> str:
     return template.format(**kwargs)
 
 
-def build_lyrics_messages(preset: dict, brief: str) -> list[dict]:
-    system_text = _load_prompt("grok_lyrics_system_ru.txt")
+def build_lyrics_tags_messages(preset: dict, brief: str) -> list[dict]:
+    system_text = _load_prompt("grok_lyrics_tags_system_ru.txt")
     user_template = _load_prompt("grok_lyrics_user_template.txt")
     user_text = _render_template(
         user_template,
@@ -95,3 +97,8 @@ def build_user_lyrics_messages(preset: dict, brief: str, user_lyrics_raw: str) -
         user_lyrics_raw=user_lyrics_raw,
     )
     return _build_grok_messages(system_text, user_text)
+
+
+def load_prompts() -> None:
+    for path in PROMPTS_DIR.glob("*.txt"):
+        _load_prompt(path.name)
@@ -2,10 +2,23 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import BigInteger, String, Integer, Date, DateTime, ForeignKey, UniqueConstraint, Text, Boolean
+from sqlalchemy import BigInteger, String, Integer, SmallInteger, Date, DateTime, ForeignKey, UniqueConstraint, Text, Boolean
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
+from app.core.task_status import TaskStatus
+
+
+class TaskStatusType(TypeDecorator):
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: TaskStatus | int | None, dialect) -> int | None:
+        return None if value is None else int(value)
+
+    def process_result_value(self, value: int | None, dialect) -> TaskStatus | None:
+        return None if value is None else TaskStatus(value)
 
 
 class User(Base):
@@ -63,7 +76,7 @@ class Task(Base):
     brief: Mapped[str | None] = mapped_column(Text, nullable=True)
     user_lyrics_raw: Mapped[str | None] = mapped_column(Text, nullable=True)
     edit_request: Mapped[str | None] = mapped_column(Text, nullable=True)
-    status: Mapped[str] = mapped_column(String(32))
+    status: Mapped[TaskStatus] = mapped_column(TaskStatusType, index=True)
     stage: Mapped[str | None] = mapped_column(String(64), nullable=True)
     progress: Mapped[int | None] = mapped_column(Integer, nullable=True)
     progress_chat_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
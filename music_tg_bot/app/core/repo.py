@@ -2,31 +2,54 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import select
+from sqlalchemy import case, exists, insert, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
 
 from app.core.models import User, Transaction, Track, Task
+from app.core.task_status import TaskStatus
 
 
 FREE_QUOTA_PER_DAY = 5
 TEXT_PRICE_RUB = 10
 
+CHARGE_OK = "charged"
+CHARGE_INSUFFICIENT = "insufficient"
+CHARGE_NOT_PAYABLE = "not_payable"
+
 
 class InsufficientFunds(ValueError):
-    pass
+    def __init__(self, message: str, balance: int) -> None:
+        super().__init__(message)
+        self.balance = balance
 
 
 def get_or_create_user(session: Session, tg_id: int) -> User:
     user = session.scalar(select(User).where(User.tg_id == tg_id))
     if user:
         return user
-    user = User(tg_id=tg_id)
-    session.add(user)
+    stmt = (
+        pg_insert(User)
+        .values(tg_id=tg_id)
+        .on_conflict_do_update(index_elements=[User.tg_id], set_={"tg_id": tg_id})
+        .returning(User)
+    )
+    user = session.scalars(stmt).one()
     session.commit()
-    session.refresh(user)
     return user
 
 
+def get_or_create_user_id(connection: Connection, tg_id: int) -> int:
+    stmt = (
+        pg_insert(User)
+        .values(tg_id=tg_id)
+        .on_conflict_do_update(index_elements=[User.tg_id], set_={"tg_id": tg_id})
+        .returning(User.id)
+    )
+    return connection.execute(stmt).scalar_one()
+
+
 def get_or_create_user_by_tg_id(session: Session, tg_id: int) -> User:
     return get_or_create_user(session, tg_id)
 
@@ -44,48 +67,55 @@ def adjust_balance(
     task_id: int | None = None,
     external_id: str | None = None,
 ) -> int:
-    user = session.scalar(select(User).where(User.tg_id == tg_id).with_for_update())
-    if not user:
-        user = User(tg_id=tg_id)
-        session.add(user)
-        session.flush()
     if delta == 0:
-        return user.balance_rub
-    new_balance = user.balance_rub + delta
-    if delta < 0 and new_balance < 0:
-        session.rollback()
-        raise InsufficientFunds("Недостаточно средств")
-    user.balance_rub = new_balance
-    transaction = Transaction(
-        user_id=user.id,
-        amount_rub=delta,
-        type=tx_type,
-        status="capture",
-        external_id=external_id,
-        task_id=task_id,
+        return get_balance(session, tg_id)
+    conditions = [User.tg_id == tg_id]
+    if delta < 0:
+        conditions.append(User.balance_rub >= -delta)
+    stmt = (
+        update(User)
+        .where(*conditions)
+        .values(balance_rub=User.balance_rub + delta)
+        .returning(User.id, User.balance_rub)
+    )
+    row = session.execute(stmt).one_or_none()
+    if row is None:
+        if delta < 0:
+            balance = session.scalar(select(User.balance_rub).where(User.tg_id == tg_id))
+            session.rollback()
+            raise InsufficientFunds("Недостаточно средств", balance or 0)
+        get_or_create_user_id(session.connection(), tg_id)
+        row = session.execute(stmt).one()
+    user_id, new_balance = row
+    session.execute(
+        insert(Transaction).values(
+            user_id=user_id,
+            amount_rub=delta,
+            type=tx_type,
+            status="capture",
+            external_id=external_id,
+            task_id=task_id,
+        )
     )
-    session.add_all([user, transaction])
     session.commit()
-    session.refresh(user)
-    return user.balance_rub
+    return new_balance
 
 
-def reset_quota_if_needed(session: Session, user: User) -> None:
+def reset_quota_if_needed(user: User) -> None:
     today = dt.date.today()
     if user.free_quota_date != today:
         user.free_quota_date = today
         user.free_quota_used = 0
-        session.add(user)
-        session.commit()
 
 
-def get_free_quota_remaining(session: Session, user: User) -> int:
-    reset_quota_if_needed(session, user)
+def get_free_quota_remaining(user: User) -> int:
+    if user.free_quota_date != dt.date.today():
+        return FREE_QUOTA_PER_DAY
     return max(0, FREE_QUOTA_PER_DAY - user.free_quota_used)
 
 
 def consume_free_quota(session: Session, user: User) -> bool:
-    reset_quota_if_needed(session, user)
+    reset_quota_if_needed(user)
     if user.free_quota_used >= FREE_QUOTA_PER_DAY:
         return False
     user.free_quota_used += 1
@@ -94,6 +124,34 @@ def consume_free_quota(session: Session, user: User) -> bool:
     return True
 
 
+def reserve_free_text(session: Session, tg_id: int) -> tuple[int, int]:
+    today = dt.date.today()
+    same_day = User.free_quota_date == today
+    stmt = (
+        update(User)
+        .where(
+            User.tg_id == tg_id,
+            or_(~same_day, User.free_quota_date.is_(None), User.free_quota_used < FREE_QUOTA_PER_DAY),
+        )
+        .values(
+            free_quota_date=today,
+            free_quota_used=case((same_day, User.free_quota_used + 1), else_=1),
+        )
+        .returning(User.free_quota_used, User.balance_rub)
+        .execution_options(synchronize_session="fetch")
+    )
+    row = session.execute(stmt).one_or_none()
+    if row is not None:
+        session.commit()
+        used, balance = row
+        return FREE_QUOTA_PER_DAY - used + 1, balance
+    user = get_or_create_user(session, tg_id)
+    remaining = get_free_quota_remaining(user)
+    if remaining > 0:
+        consume_free_quota(session, user)
+    return remaining, user.balance_rub
+
+
 def charge_text(session: Session, user: User) -> bool:
     try:
         adjust_balance(session, user.tg_id, -TEXT_PRICE_RUB, "spend_text")
@@ -102,20 +160,121 @@ def charge_text(session: Session, user: User) -> bool:
     return True
 
 
-def add_topup(session: Session, user: User, amount_rub: int, external_id: str) -> None:
-    adjust_balance(session, user.tg_id, amount_rub, "topup", external_id=external_id)
-
-
-def apply_welcome_bonus(session: Session, user: User, amount_rub: int) -> bool:
-    if user.welcome_bonus_given:
+def add_topup(connection: Connection, tg_id: int, amount_rub: int, external_id: str) -> bool:
+    user_id = get_or_create_user_id(connection, tg_id)
+    transaction_id = connection.execute(
+        pg_insert(Transaction)
+        .values(
+            user_id=user_id,
+            amount_rub=amount_rub,
+            type="topup",
+            status="capture",
+            external_id=external_id,
+        )
+        .on_conflict_do_nothing(constraint="uq_transactions_external_id")
+        .returning(Transaction.id)
+    ).scalar_one_or_none()
+    if transaction_id is None:
         return False
-    adjust_balance(session, user.tg_id, amount_rub, "welcome_bonus")
-    user.welcome_bonus_given = True
-    session.add(user)
-    session.commit()
+    connection.execute(
+        update(User).where(User.id == user_id).values(balance_rub=User.balance_rub + amount_rub)
+    )
     return True
 
 
+def charge_task(
+    connection: Connection,
+    task_id: int,
+    tg_id: int,
+    amount_rub: int,
+    tx_type: str,
+    paid_status: TaskStatus,
+    unpaid_status: TaskStatus,
+    payable_statuses: tuple[TaskStatus, ...],
+) -> tuple[str, int, str | None]:
+    now = dt.datetime.utcnow()
+    payable = (
+        select(Task.id, Task.title_text)
+        .where(Task.id == task_id, Task.status.in_(payable_statuses))
+        .with_for_update()
+        .cte("payable")
+    )
+    charged = (
+        update(User)
+        .where(User.tg_id == tg_id, User.balance_rub >= amount_rub, exists(payable.select()))
+        .values(balance_rub=User.balance_rub - amount_rub)
+        .returning(User.id, User.balance_rub)
+        .cte("charged")
+    )
+    logged = (
+        insert(Transaction)
+        .from_select(
+            ["user_id", "amount_rub", "type", "status", "task_id", "created_at"],
+            select(
+                charged.c.id,
+                literal(-amount_rub),
+                literal(tx_type),
+                literal("capture"),
+                literal(task_id),
+                literal(now),
+            ),
+        )
+        .cte("logged")
+    )
+    moved = (
+        update(Task)
+        .where(Task.id.in_(select(payable.c.id)))
+        .values(
+            status=case((exists(charged.select()), paid_status), else_=unpaid_status),
+            updated_at=now,
+        )
+        .returning(Task.id)
+        .cte("moved")
+    )
+    stmt = (
+        select(
+            exists(payable.select()),
+            select(payable.c.title_text).scalar_subquery(),
+            select(charged.c.balance_rub).scalar_subquery(),
+            select(User.balance_rub).where(User.tg_id == tg_id).scalar_subquery(),
+        )
+        .add_cte(logged)
+        .add_cte(moved)
+    )
+    is_payable, title_text, charged_balance, balance = connection.execute(stmt).one()
+    if not is_payable:
+        return CHARGE_NOT_PAYABLE, balance or 0, None
+    if charged_balance is None:
+        return CHARGE_INSUFFICIENT, balance or 0, title_text
+    return CHARGE_OK, charged_balance, title_text
+
+
+def grant_welcome_bonus(connection: Connection, tg_id: int, amount_rub: int) -> bool:
+    user_id = get_or_create_user_id(connection, tg_id)
+    granted = (
+        update(User)
+        .where(User.id == user_id, User.welcome_bonus_given.is_(False))
+        .values(balance_rub=User.balance_rub + amount_rub, welcome_bonus_given=True)
+        .returning(User.id)
+        .cte("granted")
+    )
+    stmt = (
+        insert(Transaction)
+        .from_select(
+            ["user_id", "amount_rub", "type", "status", "created_at"],
+            select(
+                granted.c.id,
+                literal(amount_rub),
+                literal("welcome_bonus"),
+                literal("capture"),
+                literal(dt.datetime.utcnow()),
+            ),
+        )
+        .returning(Transaction.id)
+    )
+    return connection.execute(stmt).first() is not None
+
+
 def create_track(
     session: Session,
     user_id: int,
@@ -126,47 +285,51 @@ def create_track(
     mp3_url_1: str,
     mp3_url_2: str,
     ttl_hours: int = 24,
-) -> Track:
+) -> int:
     expires_at = dt.datetime.utcnow() + dt.timedelta(hours=ttl_hours)
-    track = Track(
-        user_id=user_id,
-        preset_id=preset_id,
-        title=title,
-        lyrics=lyrics,
-        tags=tags,
-        mp3_url_1=mp3_url_1,
-        mp3_url_2=mp3_url_2,
-        expires_at=expires_at,
-    )
-    session.add(track)
+    track_id = session.execute(
+        insert(Track)
+        .values(
+            user_id=user_id,
+            preset_id=preset_id,
+            title=title,
+            lyrics=lyrics,
+            tags=tags,
+            mp3_url_1=mp3_url_1,
+            mp3_url_2=mp3_url_2,
+            expires_at=expires_at,
+        )
+        .returning(Track.id)
+    ).scalar_one()
     session.commit()
-    session.refresh(track)
-    return track
+    return track_id
 
 
 def create_task(
     session: Session,
     user_id: int,
     preset_id: str,
-    status: str,
+    status: TaskStatus,
     brief: str | None = None,
     user_lyrics_raw: str | None = None,
     progress_chat_id: int | None = None,
     progress_message_id: int | None = None,
-) -> Task:
-    task = Task(
-        user_id=user_id,
-        preset_id=preset_id,
-        status=status,
-        brief=brief,
-        user_lyrics_raw=user_lyrics_raw,
-        progress_chat_id=progress_chat_id,
-        progress_message_id=progress_message_id,
-    )
-    session.add(task)
+) -> int:
+    task_id = session.execute(
+        insert(Task)
+        .values(
+            user_id=user_id,
+            preset_id=preset_id,
+            status=status,
+            brief=brief,
+            user_lyrics_raw=user_lyrics_raw,
+            progress_chat_id=progress_chat_id,
+            progress_message_id=progress_message_id,
+        )
+        .returning(Task.id)
+    ).scalar_one()
     session.commit()
-    session.refresh(task)
-    return task
+    return task_id
 
 
 def get_task(session: Session, task_id: int) -> Task | None:
@@ -174,12 +337,8 @@ def get_task(session: Session, task_id: int) -> Task | None:
 
 
 def update_task(session: Session, task_id: int, **fields: object) -> Task | None:
-    task = session.get(Task, task_id)
-    if not task:
-        return None
-    for key, value in fields.items():
-        setattr(task, key, value)
-    session.add(task)
+    task = session.scalars(
+        update(Task).where(Task.id == task_id).values(**fields).returning(Task)
+    ).one_or_none()
     session.commit()
-    session.refresh(task)
     return task
@@ -1,23 +1,48 @@
 from __future__ import annotations
 
+from enum import IntEnum
 
-DRAFT = "DRAFT"
-TEXT_QUEUED = "TEXT_QUEUED"
-TEXT_RUNNING = "TEXT_RUNNING"
-TEXT_POLLING = "TEXT_POLLING"
-TAGS_RUNNING = "TAGS_RUNNING"
-REVIEW_READY = "REVIEW_READY"
-WAITING_EDIT_REQUEST = "WAITING_EDIT_REQUEST"
-EDIT_QUEUED = "EDIT_QUEUED"
-EDIT_RUNNING = "EDIT_RUNNING"
-EDIT_POLLING = "EDIT_POLLING"
-TITLE_WAITING = "TITLE_WAITING"
-PAYMENT_WAITING = "PAYMENT_WAITING"
-AUDIO_QUEUED = "AUDIO_QUEUED"
-AUDIO_RUNNING = "AUDIO_RUNNING"
-AUDIO_POLLING = "AUDIO_POLLING"
-DOWNLOADING_AUDIO = "DOWNLOADING_AUDIO"
-SENDING_DOCUMENT = "SENDING_DOCUMENT"
-SUCCEEDED = "SUCCEEDED"
-FAILED = "FAILED"
-CANCELED = "CANCELED"
+
+class TaskStatus(IntEnum):
+    DRAFT = 1
+    TEXT_QUEUED = 2
+    TEXT_RUNNING = 3
+    TEXT_POLLING = 4
+    TAGS_RUNNING = 5
+    REVIEW_READY = 6
+    WAITING_EDIT_REQUEST = 7
+    EDIT_QUEUED = 8
+    EDIT_RUNNING = 9
+    EDIT_POLLING = 10
+    TITLE_WAITING = 11
+    PAYMENT_WAITING = 12
+    AUDIO_QUEUED = 13
+    AUDIO_RUNNING = 14
+    AUDIO_POLLING = 15
+    DOWNLOADING_AUDIO = 16
+    SENDING_DOCUMENT = 17
+    SUCCEEDED = 18
+    FAILED = 19
+    CANCELED = 20
+
+
+DRAFT = TaskStatus.DRAFT
+TEXT_QUEUED = TaskStatus.TEXT_QUEUED
+TEXT_RUNNING = TaskStatus.TEXT_RUNNING
+TEXT_POLLING = TaskStatus.TEXT_POLLING
+TAGS_RUNNING = TaskStatus.TAGS_RUNNING
+REVIEW_READY = TaskStatus.REVIEW_READY
+WAITING_EDIT_REQUEST = TaskStatus.WAITING_EDIT_REQUEST
+EDIT_QUEUED = TaskStatus.EDIT_QUEUED
+EDIT_RUNNING = TaskStatus.EDIT_RUNNING
+EDIT_POLLING = TaskStatus.EDIT_POLLING
+TITLE_WAITING = TaskStatus.TITLE_WAITING
+PAYMENT_WAITING = TaskStatus.PAYMENT_WAITING
+AUDIO_QUEUED = TaskStatus.AUDIO_QUEUED
+AUDIO_RUNNING = TaskStatus.AUDIO_RUNNING
+AUDIO_POLLING = TaskStatus.AUDIO_POLLING
+DOWNLOADING_AUDIO = TaskStatus.DOWNLOADING_AUDIO
+SENDING_DOCUMENT = TaskStatus.SENDING_DOCUMENT
+SUCCEEDED = TaskStatus.SUCCEEDED
+FAILED = TaskStatus.FAILED
+CANCELED = TaskStatus.CANCELED
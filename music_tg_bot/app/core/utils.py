@@ -6,17 +6,20 @@ from typing import Optional
 
 
 INVALID_FILENAME_CHARS = re.compile(r"[\\/:*?\"<>|]")
+_INVALID_TITLE_TABLE = str.maketrans("", "", "\\/:*?\"<>|")
+_WHITESPACE_RUN = re.compile(r"\s+")
+_AUTO_TITLE_KEYWORD = re.compile(r"[А-Яа-яЁёA-Za-z0-9]{3,}")
 BOT_FILENAME_SUFFIX = "pelicanaudiobot @PelicanAudioBot"
 
 
 def sanitize_title(title: str, max_length: int = 40) -> str:
-    cleaned = INVALID_FILENAME_CHARS.sub("", title).strip()
+    cleaned = title.translate(_INVALID_TITLE_TABLE).strip()
     return cleaned[:max_length] or "Трек"
 
 
 def sanitize_filename(title: str, max_length: int = 40) -> str:
     cleaned = sanitize_title(title, max_length=max_length)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    cleaned = _WHITESPACE_RUN.sub(" ", cleaned).strip()
     return cleaned or "Трек"
 
 
@@ -26,7 +29,7 @@ def build_track_filename(title: str) -> str:
 
 
 def build_auto_title(preset_title: str, brief: str) -> str:
-    match = re.search(r"[А-Яа-яЁёA-Za-z0-9]{3,}", brief)
+    match = _AUTO_TITLE_KEYWORD.search(brief)
     if match:
         keyword = match.group(0)
     else:
@@ -11,6 +11,11 @@ from app.core.config import settings
 
 logger = logging.getLogger("genapi")
 
+_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=10),
+)
+
 
 class GenApiError(RuntimeError):
     pass
@@ -55,7 +60,7 @@ def _request_with_retries(
     ssl_attempts = 0
     for attempt in range(1, retries + 1):
         try:
-            response = httpx.request(
+            response = _client.request(
                 method,
                 url,
                 headers=_headers(),
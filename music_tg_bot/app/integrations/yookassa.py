@@ -3,6 +3,7 @@ from __future__ import annotations
 import base64
 import logging
 import uuid
+from collections.abc import Mapping
 from typing import Any
 
 import httpx
@@ -11,11 +12,21 @@ from app.core.config import settings
 
 logger = logging.getLogger("yookassa")
 
+_client = httpx.AsyncClient(
+    http2=True,
+    timeout=20,
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+
 
 class YooKassaError(RuntimeError):
     pass
 
 
+async def close_client() -> None:
+    await _client.aclose()
+
+
 def _auth_header() -> dict[str, str]:
     if not settings.yookassa_shop_id or not settings.yookassa_secret_key:
         raise YooKassaError("Оплата временно недоступна: не настроены ключи")
@@ -24,7 +35,7 @@ def _auth_header() -> dict[str, str]:
     return {"Authorization": f"Basic {encoded}"}
 
 
-def create_payment(amount_rub: int, description: str, user_id: int) -> str:
+async def create_payment(amount_rub: int, description: str, tg_id: int) -> str:
     idempotence_key = str(uuid.uuid4())
     payload = {
         "amount": {"value": f"{amount_rub}.00", "currency": "RUB"},
@@ -34,13 +45,13 @@ def create_payment(amount_rub: int, description: str, user_id: int) -> str:
         },
         "capture": True,
         "description": description,
-        "metadata": {"user_id": str(user_id), "amount_rub": str(amount_rub)},
+        "metadata": {"user_id": str(tg_id), "amount_rub": str(amount_rub)},
     }
     headers = _auth_header()
     headers.update({"Idempotence-Key": idempotence_key})
     url = "https://api.yookassa.ru/v3/payments"
     try:
-        response = httpx.post(url, headers=headers, json=payload, timeout=20)
+        response = await _client.post(url, headers=headers, json=payload)
         response.raise_for_status()
     except httpx.HTTPError as exc:
         raise YooKassaError(f"Ошибка YooKassa: {exc}") from exc
@@ -49,7 +60,9 @@ def create_payment(amount_rub: int, description: str, user_id: int) -> str:
     return confirmation.get("confirmation_url", "")
 
 
-def parse_webhook(payload: dict[str, Any]) -> tuple[str, int, str]:
+def parse_webhook(payload: Mapping[str, Any]) -> tuple[str, int, int]:
+    if not isinstance(payload, Mapping):
+        raise YooKassaError("Некорректные данные платежа")
     event = payload.get("event")
     if event != "payment.succeeded":
         raise YooKassaError("Платеж не подтвержден")
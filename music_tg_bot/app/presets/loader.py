@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
@@ -8,9 +9,28 @@ import yaml
 PRESETS_PATH = Path(__file__).resolve().parent / "presets.yaml"
 
 
-def load_presets() -> list[dict[str, Any]]:
+@lru_cache(maxsize=1)
+def _load_data() -> dict[str, Any]:
     with PRESETS_PATH.open("r", encoding="utf-8") as handle:
-        data = yaml.safe_load(handle)
+        return yaml.safe_load(handle)
+
+
+@lru_cache(maxsize=1)
+def _load_presets_by_id() -> dict[str, dict[str, Any]]:
+    return {preset["id"]: preset for preset in load_presets()}
+
+
+@lru_cache(maxsize=1)
+def _load_presets_by_category() -> dict[str, tuple[dict[str, Any], ...]]:
+    grouped: dict[str, list[dict[str, Any]]] = {}
+    for preset in load_presets():
+        grouped.setdefault(preset.get("category_id"), []).append(preset)
+    return {category_id: tuple(presets) for category_id, presets in grouped.items()}
+
+
+@lru_cache(maxsize=1)
+def load_presets() -> list[dict[str, Any]]:
+    data = _load_data()
     categories = {cat["id"]: cat for cat in data.get("categories", [])}
     presets: list[dict[str, Any]] = []
     for preset in data.get("presets", []):
@@ -18,25 +38,22 @@ def load_presets() -> list[dict[str, Any]]:
         category = categories.get(preset.get("category_id"))
         if category and "category_title" not in preset:
             preset["category_title"] = category.get("title")
+        preset["title_line"] = f"🎛 Пресет: {preset['title']}"
+        preset["header"] = f"{preset['title_line']}\nЦена аудио: {preset['price_audio_rub']} ₽"
         presets.append(preset)
     return presets
 
 
 def load_categories() -> list[dict[str, Any]]:
-    with PRESETS_PATH.open("r", encoding="utf-8") as handle:
-        data = yaml.safe_load(handle)
-    return data.get("categories", [])
+    return _load_data().get("categories", [])
 
 
 def get_presets_by_category(category_id: str) -> list[dict[str, Any]]:
-    return [preset for preset in load_presets() if preset.get("category_id") == category_id]
+    return list(_load_presets_by_category().get(category_id, ()))
 
 
 def get_preset(preset_id: str) -> dict[str, Any] | None:
-    for preset in load_presets():
-        if preset["id"] == preset_id:
-            return preset
-    return None
+    return _load_presets_by_id().get(preset_id)
 
 
 def get_starter_preset() -> dict[str, Any] | None:
@@ -44,3 +61,10 @@ def get_starter_preset() -> dict[str, Any] | None:
         if preset.get("starter"):
             return preset
     return None
+
+
+def reload_presets() -> None:
+    _load_data.cache_clear()
+    load_presets.cache_clear()
+    _load_presets_by_id.cache_clear()
+    _load_presets_by_category.cache_clear()
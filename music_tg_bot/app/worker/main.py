@@ -8,6 +8,9 @@ from rq import Worker, Queue, Connection
 
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.core.generation import load_prompts
+from app.presets.loader import load_presets
+from app.worker import tasks  # noqa: F401
 
 logger = logging.getLogger("worker")
 
@@ -30,6 +33,8 @@ def run_cleanup_loop() -> None:
 
 def main() -> None:
     setup_logging()
+    load_presets()
+    load_prompts()
     redis_conn = Redis.from_url(settings.redis_url)
 
     thread = threading.Thread(target=run_cleanup_loop, daemon=True)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Callable
+
+from redis import Redis
+from rq import Queue
+
+from app.core.config import settings
+
+logger = logging.getLogger("worker.submit")
+
+SUBMIT_BATCH_SIZE = 64
+SUBMIT_FLUSH_SECONDS = 0.02
+
+_pending: asyncio.Queue[tuple[Any, asyncio.Future[str]]] | None = None
+_flusher: asyncio.Task[None] | None = None
+
+
+@lru_cache(maxsize=1)
+def get_queue() -> Queue:
+    return Queue("default", connection=Redis.from_url(settings.redis_url))
+
+
+async def _collect_batch(pending: asyncio.Queue[tuple[Any, asyncio.Future[str]]]) -> list[tuple[Any, asyncio.Future[str]]]:
+    batch = [await pending.get()]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SUBMIT_FLUSH_SECONDS
+    while len(batch) < SUBMIT_BATCH_SIZE:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(pending.get(), timeout=timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+async def _flush_forever(pending: asyncio.Queue[tuple[Any, asyncio.Future[str]]]) -> None:
+    queue = get_queue()
+    while True:
+        batch = await _collect_batch(pending)
+        try:
+            jobs = await asyncio.to_thread(queue.enqueue_many, [job_data for job_data, _ in batch])
+        except Exception as exc:
+            logger.exception("Не удалось поставить задачи в очередь", extra={"count": len(batch)})
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            continue
+        for (_, future), job in zip(batch, jobs):
+            if not future.done():
+                future.set_result(job.id)
+
+
+async def submit(func: Callable[..., Any], *args: Any) -> str:
+    global _pending, _flusher
+    if _flusher is None or _flusher.done():
+        _pending = asyncio.Queue()
+        _flusher = asyncio.create_task(_flush_forever(_pending))
+    future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+    await _pending.put((Queue.prepare_data(func, args=args), future))
+    return await future
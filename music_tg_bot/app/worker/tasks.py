@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import datetime as dt
 import logging
 from pathlib import Path
 
@@ -9,19 +10,20 @@ from aiogram import Bot
 from aiogram.enums import ChatAction
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import FSInputFile
-from redis import Redis
-from rq import Queue
+from rq import get_current_job
 
+from app.bot.keyboards.inline import REVIEW_KEYBOARD, second_variant_keyboard
+from app.core.cache import invalidate_balance_sync
 from app.core.config import settings
 from app.core.db import SessionLocal
 from app.core.generation import (
     build_edit_messages,
     build_instrumental_messages,
-    build_lyrics_messages,
+    build_lyrics_tags_messages,
     build_tags_messages,
     build_user_lyrics_messages,
 )
-from app.core.models import User
+from app.core.models import Track, User
 from app.core.repo import (
     FREE_QUOTA_PER_DAY,
     adjust_balance,
@@ -45,14 +47,30 @@ from app.core.task_status import (
     TEXT_RUNNING,
 )
 from app.core.utils import build_track_filename, sanitize_filename
-from app.integrations.genapi import call_grok, call_suno, GenApiError
+from app.integrations.genapi import call_grok, call_suno, GenApiError, GenApiResult
 from app.presets.loader import get_preset
+from app.worker.submit import submit
 
 logger = logging.getLogger("worker.tasks")
 
 LYRICS_MESSAGE_LIMIT = 3500
 
 
+def _parse_lyrics_tags_result(result: str) -> tuple[str, str | None]:
+    lines = result.strip().splitlines()
+    for index in range(len(lines) - 1, -1, -1):
+        stripped = lines[index].strip()
+        if not stripped:
+            continue
+        if stripped.lower().startswith("tags:"):
+            tags = stripped.split(":", 1)[1].strip()
+            lyrics = "\n".join(lines[:index]).strip()
+            if tags and lyrics:
+                return lyrics, tags
+        break
+    return result.strip(), None
+
+
 def _parse_instrumental_result(result: str) -> tuple[str | None, str]:
     title: str | None = None
     prompt_lines: list[str] = []
@@ -113,36 +131,20 @@ async def _send_or_edit_status(
     return sent.message_id
 
 
-def _get_queue() -> Queue:
-    redis_conn = Redis.from_url(settings.redis_url)
-    return Queue("default", connection=redis_conn)
-
+async def enqueue_text_generation(task_id: int) -> str:
+    return await submit(generate_text_task, task_id)
 
-def enqueue_text_generation(task_id: int) -> str:
-    queue = _get_queue()
-    job = queue.enqueue(generate_text_task, task_id)
-    return job.id
 
+async def enqueue_edit_generation(task_id: int) -> str:
+    return await submit(generate_edit_task, task_id)
 
-def enqueue_edit_generation(task_id: int) -> str:
-    queue = _get_queue()
-    job = queue.enqueue(generate_edit_task, task_id)
-    return job.id
 
-
-def enqueue_audio_generation(
+async def enqueue_audio_generation(
     task_id: int,
     chat_id: int,
     status_message_id: int | None,
 ) -> str:
-    queue = _get_queue()
-    job = queue.enqueue(
-        generate_audio_task,
-        task_id,
-        chat_id,
-        status_message_id,
-    )
-    return job.id
+    return await submit(generate_audio_task, task_id, chat_id, status_message_id)
 
 
 def _download_file(url: str, target_path: Path) -> None:
@@ -172,9 +174,20 @@ def _update_progress_message(
     return asyncio.run(_run())
 
 
-def _store_message_id(task_id: int, message_id: int) -> None:
-    with SessionLocal() as session:
-        update_task(session, task_id, progress_message_id=message_id)
+def _store_message_id(task_id: int, message_id: int, stored_message_id: int | None) -> int:
+    if stored_message_id != message_id:
+        with SessionLocal() as session:
+            update_task(session, task_id, progress_message_id=message_id)
+    return message_id
+
+
+def _log_queue_latency(kind: str, task_id: int) -> None:
+    job = get_current_job()
+    if job is None or job.enqueued_at is None:
+        return
+    started_at = job.started_at or dt.datetime.utcnow()
+    latency = (started_at - job.enqueued_at).total_seconds()
+    logger.info("Задержка очереди (%s) для задачи %s: %.2f с", kind, task_id, latency)
 
 
 def _load_task_and_preset(task_id: int) -> tuple[object | None, dict | None]:
@@ -189,7 +202,7 @@ def _get_user_balance_and_remaining(user_id: int) -> tuple[int, int]:
         user = session.get(User, user_id)
         if not user:
             return 0, 0
-        remaining = get_free_quota_remaining(session, user)
+        remaining = get_free_quota_remaining(user)
         return user.balance_rub, remaining
 
 
@@ -310,9 +323,11 @@ async def _send_review_payload(
 
 
 def generate_text_task(task_id: int) -> None:
+    _log_queue_latency("text", task_id)
     task, preset = _load_task_and_preset(task_id)
     if not task or not preset:
         return
+    stored_message_id = task.progress_message_id
     logger.info(
         "Старт генерации текста",
         extra={
@@ -322,7 +337,7 @@ def generate_text_task(task_id: int) -> None:
             "user_id": task.user_id,
         },
     )
-    status_prefix = f"🎛 Пресет: {preset['title']}"
+    status_prefix = preset["title_line"]
     mode = preset.get("mode", "song")
     lyrics_for_review: str | None = None
     with SessionLocal() as session:
@@ -332,12 +347,14 @@ def generate_text_task(task_id: int) -> None:
         initial_status = "⏳ Генерирую описание инструментала…"
     elif mode == "user_lyrics":
         initial_status = "⏳ Оформляю текст…"
-    status_message_id = _update_progress_message(
-        chat_id=task.progress_chat_id,
-        message_id=task.progress_message_id,
-        text=f"{status_prefix}\n{initial_status}",
-    )
-    _store_message_id(task_id, status_message_id)
+    status_message_id = task.progress_message_id
+    if not status_message_id:
+        status_message_id = _update_progress_message(
+            chat_id=task.progress_chat_id,
+            message_id=None,
+            text=f"{status_prefix}\n{initial_status}",
+        )
+        stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
     try:
         if mode == "instrumental":
             instrumental_result = call_grok(build_instrumental_messages(preset, task.brief or ""))
@@ -354,7 +371,7 @@ def generate_text_task(task_id: int) -> None:
                     message_id=status_message_id,
                     text=f"{status_prefix}\n⏳ Генерирую описание инструментала… (polling)",
                 )
-                _store_message_id(task_id, status_message_id)
+                stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
             suggested_title, prompt = _parse_instrumental_result(instrumental_result.result)
             lyrics_for_review = prompt
             with SessionLocal() as session:
@@ -371,7 +388,7 @@ def generate_text_task(task_id: int) -> None:
                 message_id=status_message_id,
                 text=f"{status_prefix}\n✅ Описание готово. Генерирую теги…",
             )
-            _store_message_id(task_id, status_message_id)
+            stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
             tags_result = call_grok(build_tags_messages(preset, prompt, mode))
         elif mode == "user_lyrics":
             lyrics_result = call_grok(
@@ -390,7 +407,7 @@ def generate_text_task(task_id: int) -> None:
                     message_id=status_message_id,
                     text=f"{status_prefix}\n⏳ Оформляю текст… (polling)",
                 )
-                _store_message_id(task_id, status_message_id)
+                stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
             lyrics = lyrics_result.result
             lyrics_for_review = lyrics
             with SessionLocal() as session:
@@ -400,10 +417,10 @@ def generate_text_task(task_id: int) -> None:
                 message_id=status_message_id,
                 text=f"{status_prefix}\n✅ Текст оформлен. Генерирую теги…",
             )
-            _store_message_id(task_id, status_message_id)
+            stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
             tags_result = call_grok(build_tags_messages(preset, lyrics, mode))
         else:
-            lyrics_result = call_grok(build_lyrics_messages(preset, task.brief or ""))
+            lyrics_result = call_grok(build_lyrics_tags_messages(preset, task.brief or ""))
             if lyrics_result.request_id is not None:
                 with SessionLocal() as session:
                     update_task(
@@ -417,18 +434,21 @@ def generate_text_task(task_id: int) -> None:
                     message_id=status_message_id,
                     text=f"{status_prefix}\n⏳ Генерирую текст… (polling)",
                 )
-                _store_message_id(task_id, status_message_id)
-            lyrics = lyrics_result.result
+                stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
+            lyrics, tags = _parse_lyrics_tags_result(lyrics_result.result)
             lyrics_for_review = lyrics
             with SessionLocal() as session:
                 update_task(session, task_id, lyrics_current=lyrics, status=TAGS_RUNNING, genapi_request_id=None)
-            status_message_id = _update_progress_message(
-                chat_id=task.progress_chat_id,
-                message_id=status_message_id,
-                text=f"{status_prefix}\n✅ Текст готов. Генерирую теги…",
-            )
-            _store_message_id(task_id, status_message_id)
-            tags_result = call_grok(build_tags_messages(preset, lyrics, mode))
+            if tags:
+                tags_result = GenApiResult(result=tags, request_id=None)
+            else:
+                status_message_id = _update_progress_message(
+                    chat_id=task.progress_chat_id,
+                    message_id=status_message_id,
+                    text=f"{status_prefix}\n✅ Текст готов. Генерирую теги…",
+                )
+                stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
+                tags_result = call_grok(build_tags_messages(preset, lyrics, mode))
         if tags_result.request_id is not None:
             with SessionLocal() as session:
                 update_task(
@@ -442,7 +462,7 @@ def generate_text_task(task_id: int) -> None:
                 message_id=status_message_id,
                 text=f"{status_prefix}\n⏳ Генерирую теги… (polling)",
             )
-            _store_message_id(task_id, status_message_id)
+            stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         tags = tags_result.result
         with SessionLocal() as session:
             update_task(
@@ -457,10 +477,8 @@ def generate_text_task(task_id: int) -> None:
             message_id=status_message_id,
             text=f"{status_prefix}\n✅ Готово. Проверь результат ниже:",
         )
-        _store_message_id(task_id, status_message_id)
+        stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         async def _send_review() -> None:
-            from app.bot.keyboards.inline import review_keyboard
-
             bot = Bot(token=settings.bot_token)
             try:
                 balance, remaining = _get_user_balance_and_remaining(task.user_id)
@@ -477,7 +495,7 @@ def generate_text_task(task_id: int) -> None:
                     remaining=remaining,
                     mode=mode,
                     filename_hint=preset.get("title"),
-                    reply_markup=review_keyboard(),
+                    reply_markup=REVIEW_KEYBOARD,
                 )
             finally:
                 await bot.session.close()
@@ -498,9 +516,11 @@ def generate_text_task(task_id: int) -> None:
 
 
 def generate_edit_task(task_id: int) -> None:
+    _log_queue_latency("edit", task_id)
     task, preset = _load_task_and_preset(task_id)
     if not task or not preset:
         return
+    stored_message_id = task.progress_message_id
     logger.info(
         "Старт правок текста",
         extra={
@@ -510,16 +530,18 @@ def generate_edit_task(task_id: int) -> None:
             "user_id": task.user_id,
         },
     )
-    status_prefix = f"🎛 Пресет: {preset['title']}"
+    status_prefix = preset["title_line"]
     mode = preset.get("mode", "song")
     with SessionLocal() as session:
         update_task(session, task_id, status=EDIT_RUNNING)
-    status_message_id = _update_progress_message(
-        chat_id=task.progress_chat_id,
-        message_id=task.progress_message_id,
-        text=f"{status_prefix}\n⏳ Применяю правки…",
-    )
-    _store_message_id(task_id, status_message_id)
+    status_message_id = task.progress_message_id
+    if not status_message_id:
+        status_message_id = _update_progress_message(
+            chat_id=task.progress_chat_id,
+            message_id=None,
+            text=f"{status_prefix}\n⏳ Применяю правки…",
+        )
+        stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
     try:
         edit_result = call_grok(build_edit_messages(task.lyrics_current or "", task.edit_request or ""))
         if edit_result.request_id is not None:
@@ -535,7 +557,7 @@ def generate_edit_task(task_id: int) -> None:
                 message_id=status_message_id,
                 text=f"{status_prefix}\n⏳ Применяю правки… (polling)",
             )
-            _store_message_id(task_id, status_message_id)
+            stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         new_lyrics = edit_result.result
         if not isinstance(new_lyrics, str) or not new_lyrics.strip():
             with SessionLocal() as session:
@@ -567,7 +589,7 @@ def generate_edit_task(task_id: int) -> None:
             message_id=status_message_id,
             text=f"{status_prefix}\n✅ Текст обновлён. Генерирую теги…",
         )
-        _store_message_id(task_id, status_message_id)
+        stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         tags_result = call_grok(build_tags_messages(preset, new_lyrics, mode))
         if tags_result.request_id is not None:
             with SessionLocal() as session:
@@ -582,7 +604,7 @@ def generate_edit_task(task_id: int) -> None:
                 message_id=status_message_id,
                 text=f"{status_prefix}\n⏳ Генерирую теги… (polling)",
             )
-            _store_message_id(task_id, status_message_id)
+            stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         tags = tags_result.result
         with SessionLocal() as session:
             update_task(
@@ -598,10 +620,8 @@ def generate_edit_task(task_id: int) -> None:
             message_id=status_message_id,
             text=f"{status_prefix}\n✅ Готово. Проверь результат ниже:",
         )
-        _store_message_id(task_id, status_message_id)
+        stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         async def _send_review() -> None:
-            from app.bot.keyboards.inline import review_keyboard
-
             bot = Bot(token=settings.bot_token)
             try:
                 balance, remaining = _get_user_balance_and_remaining(task.user_id)
@@ -618,7 +638,7 @@ def generate_edit_task(task_id: int) -> None:
                     remaining=remaining,
                     mode=mode,
                     filename_hint=preset.get("title"),
-                    reply_markup=review_keyboard(),
+                    reply_markup=REVIEW_KEYBOARD,
                 )
             finally:
                 await bot.session.close()
@@ -643,9 +663,11 @@ def generate_audio_task(
     chat_id: int,
     status_message_id: int | None,
 ) -> None:
+    _log_queue_latency("audio", task_id)
     task, preset = _load_task_and_preset(task_id)
     if not task or not preset:
         return
+    stored_message_id = task.progress_message_id
     title_text = (task.title_text or "").strip()
     title_line = f"🎼 Название: {title_text}" if title_text else "🎼 Название: —"
     logger.info(
@@ -657,7 +679,7 @@ def generate_audio_task(
             "user_id": task.user_id,
         },
     )
-    status_text_prefix = f"🎛 Пресет: {preset['title']}\n{title_line}"
+    status_text_prefix = f"{preset['title_line']}\n{title_line}"
     try:
         with SessionLocal() as session:
             update_task(session, task_id, status=AUDIO_RUNNING)
@@ -666,7 +688,7 @@ def generate_audio_task(
             message_id=status_message_id,
             text=f"{status_text_prefix}\n⏳ Генерирую аудио…",
         )
-        _store_message_id(task_id, status_message_id)
+        stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         prompt = task.lyrics_current or ""
         if preset.get("mode") == "instrumental":
             required_phrase = "инструментальная композиция, без вокала, без слов"
@@ -686,12 +708,12 @@ def generate_audio_task(
                 message_id=status_message_id,
                 text=f"{status_text_prefix}\n⏳ Генерирую аудио… (polling)",
             )
-            _store_message_id(task_id, status_message_id)
+            stored_message_id = _store_message_id(task_id, status_message_id, stored_message_id)
         urls = suno_result.result
         mp3_url_1, mp3_url_2 = urls[0], urls[1]
         track_id = None
         with SessionLocal() as session:
-            track = create_track(
+            track_id = create_track(
                 session,
                 user_id=task.user_id,
                 preset_id=task.preset_id,
@@ -701,7 +723,6 @@ def generate_audio_task(
                 mp3_url_1=mp3_url_1,
                 mp3_url_2=mp3_url_2,
             )
-            track_id = track.id
             update_task(
                 session,
                 task_id,
@@ -720,6 +741,7 @@ def generate_audio_task(
                 user = session.get(User, task.user_id)
                 if user:
                     adjust_balance(session, user.tg_id, price, "refund", task_id=task_id)
+                    invalidate_balance_sync(user.tg_id)
             update_task(session, task_id, status=FAILED, error_message=str(exc))
         async def _notify_failure() -> None:
             bot = Bot(token=settings.bot_token)
@@ -822,8 +844,6 @@ def generate_audio_task(
         finally:
             await bot.session.close()
 
-    from app.bot.keyboards.inline import second_variant_keyboard
-
     asyncio.run(_send())
     try:
         file_path.unlink()
@@ -831,15 +851,19 @@ def generate_audio_task(
         logger.warning("Не удалось удалить временный файл %s: %s", file_path, exc)
 
 
-async def deliver_second_variant(track_id: int, chat_id: int) -> None:
-    from app.core.models import Track
-
+def _load_second_variant(track_id: int) -> tuple[str, str] | None:
     with SessionLocal() as session:
         track = session.get(Track, track_id)
         if not track:
-            return
-        mp3_url_2 = track.mp3_url_2
-        title = track.title
+            return None
+        return track.mp3_url_2, track.title
+
+
+async def deliver_second_variant(track_id: int, chat_id: int) -> None:
+    variant = await asyncio.to_thread(_load_second_variant, track_id)
+    if not variant:
+        return
+    mp3_url_2, title = variant
 
     tmp_dir = Path(settings.storage_dir) / "tmp"
     tmp_dir.mkdir(parents=True, exist_ok=True)
@@ -849,7 +873,7 @@ async def deliver_second_variant(track_id: int, chat_id: int) -> None:
     async with httpx.AsyncClient(timeout=120) as client:
         response = await client.get(mp3_url_2)
         response.raise_for_status()
-        file_path.write_bytes(response.content)
+    await asyncio.to_thread(file_path.write_bytes, response.content)
 
     bot = Bot(token=settings.bot_token)
     await bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_DOCUMENT)
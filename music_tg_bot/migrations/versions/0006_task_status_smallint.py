@@ -0,0 +1,66 @@
+"""store task status as smallint
+
+Revision ID: 0006_task_status_smallint
+Revises: 0005_add_task_id_to_transactions
+Create Date: 2025-03-01 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006_task_status_smallint"
+down_revision = "0005_add_task_id_to_transactions"
+branch_labels = None
+depends_on = None
+
+STATUSES = [
+    ("DRAFT", 1),
+    ("TEXT_QUEUED", 2),
+    ("TEXT_RUNNING", 3),
+    ("TEXT_POLLING", 4),
+    ("TAGS_RUNNING", 5),
+    ("REVIEW_READY", 6),
+    ("WAITING_EDIT_REQUEST", 7),
+    ("EDIT_QUEUED", 8),
+    ("EDIT_RUNNING", 9),
+    ("EDIT_POLLING", 10),
+    ("TITLE_WAITING", 11),
+    ("PAYMENT_WAITING", 12),
+    ("AUDIO_QUEUED", 13),
+    ("AUDIO_RUNNING", 14),
+    ("AUDIO_POLLING", 15),
+    ("DOWNLOADING_AUDIO", 16),
+    ("SENDING_DOCUMENT", 17),
+    ("SUCCEEDED", 18),
+    ("FAILED", 19),
+    ("CANCELED", 20),
+]
+FAILED = 19
+
+
+def upgrade() -> None:
+    cases = " ".join(f"WHEN '{name}' THEN {value}" for name, value in STATUSES)
+    op.alter_column(
+        "tasks",
+        "status",
+        existing_type=sa.String(length=32),
+        type_=sa.SmallInteger(),
+        existing_nullable=False,
+        postgresql_using=f"CASE status {cases} ELSE {FAILED} END",
+    )
+    op.create_index("ix_tasks_status", "tasks", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tasks_status", table_name="tasks")
+    cases = " ".join(f"WHEN {value} THEN '{name}'" for name, value in STATUSES)
+    op.alter_column(
+        "tasks",
+        "status",
+        existing_type=sa.SmallInteger(),
+        type_=sa.String(length=32),
+        existing_nullable=False,
+        postgresql_using=f"CASE status {cases} ELSE 'FAILED' END",
+    )
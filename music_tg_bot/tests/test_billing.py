@@ -0,0 +1,182 @@
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL,
+    reason="TEST_DATABASE_URL не задан, нужен Postgres",
+)
+
+if TEST_DATABASE_URL:
+    from sqlalchemy import create_engine, func, select, text
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.db import Base
+    from app.core.models import Task, Transaction, User
+    from app.core.repo import (
+        CHARGE_INSUFFICIENT,
+        CHARGE_NOT_PAYABLE,
+        CHARGE_OK,
+        FREE_QUOTA_PER_DAY,
+        InsufficientFunds,
+        add_topup,
+        adjust_balance,
+        charge_task,
+        create_task,
+        get_or_create_user,
+        grant_welcome_bonus,
+        reserve_free_text,
+        update_task,
+    )
+    from app.core.task_status import AUDIO_QUEUED, DRAFT, PAYMENT_WAITING
+
+TG_ID = 1001
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with engine.begin() as connection:
+        connection.execute(text("TRUNCATE transactions, tracks, tasks, users RESTART IDENTITY CASCADE"))
+    factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    with factory() as session:
+        yield session
+
+
+def _balance(session, tg_id: int = TG_ID) -> int:
+    return session.scalar(select(User.balance_rub).where(User.tg_id == tg_id))
+
+
+def _transactions(session) -> int:
+    return session.scalar(select(func.count()).select_from(Transaction))
+
+
+def test_adjust_balance_credit_creates_user(session) -> None:
+    assert adjust_balance(session, TG_ID, 100, "admin_add") == 100
+    assert _balance(session) == 100
+    assert _transactions(session) == 1
+
+
+def test_adjust_balance_debit(session) -> None:
+    adjust_balance(session, TG_ID, 100, "admin_add")
+    assert adjust_balance(session, TG_ID, -30, "spend_text") == 70
+    assert _balance(session) == 70
+    assert _transactions(session) == 2
+
+
+def test_adjust_balance_rejects_overdraft(session) -> None:
+    adjust_balance(session, TG_ID, 5, "admin_add")
+    with pytest.raises(InsufficientFunds) as info:
+        adjust_balance(session, TG_ID, -10, "spend_text")
+    assert info.value.balance == 5
+    assert _balance(session) == 5
+    assert _transactions(session) == 1
+
+
+def test_adjust_balance_rejects_unknown_user_without_insert(session) -> None:
+    with pytest.raises(InsufficientFunds) as info:
+        adjust_balance(session, TG_ID, -10, "spend_text")
+    assert info.value.balance == 0
+    assert session.scalar(select(func.count()).select_from(User)) == 0
+
+
+def test_add_topup_is_idempotent(session) -> None:
+    with session.begin():
+        assert add_topup(session.connection(), TG_ID, 200, "pay-1") is True
+    with session.begin():
+        assert add_topup(session.connection(), TG_ID, 200, "pay-1") is False
+    assert _balance(session) == 200
+    assert _transactions(session) == 1
+
+
+def test_grant_welcome_bonus_once(session) -> None:
+    with session.begin():
+        assert grant_welcome_bonus(session.connection(), TG_ID, 79) is True
+    with session.begin():
+        assert grant_welcome_bonus(session.connection(), TG_ID, 79) is False
+    assert _balance(session) == 79
+    assert _transactions(session) == 1
+
+
+def test_reserve_free_text_counts_down(session) -> None:
+    get_or_create_user(session, TG_ID)
+    remaining = [reserve_free_text(session, TG_ID)[0] for _ in range(FREE_QUOTA_PER_DAY + 1)]
+    assert remaining == list(range(FREE_QUOTA_PER_DAY, 0, -1)) + [0]
+
+
+def _task(session, user_id: int) -> int:
+    task_id = create_task(session, user_id=user_id, preset_id="p", status=PAYMENT_WAITING)
+    update_task(session, task_id, title_text="Песня")
+    return task_id
+
+
+def _charge(session, task_id: int, amount: int, unpaid_status):
+    return charge_task(
+        session.connection(),
+        task_id,
+        TG_ID,
+        amount,
+        "spend_audio",
+        paid_status=AUDIO_QUEUED,
+        unpaid_status=unpaid_status,
+        payable_statuses=(PAYMENT_WAITING,),
+    )
+
+
+def test_charge_task_charges_and_logs(session) -> None:
+    user = get_or_create_user(session, TG_ID)
+    adjust_balance(session, TG_ID, 100, "admin_add")
+    task_id = _task(session, user.id)
+    with session.begin():
+        result = _charge(session, task_id, 79, PAYMENT_WAITING)
+    assert result == (CHARGE_OK, 21, "Песня")
+    assert _balance(session) == 21
+    assert session.get(Task, task_id, populate_existing=True).status == AUDIO_QUEUED
+    spent = session.scalar(select(Transaction).where(Transaction.type == "spend_audio"))
+    assert (spent.amount_rub, spent.task_id) == (-79, task_id)
+
+
+def test_charge_task_insufficient_funds(session) -> None:
+    user = get_or_create_user(session, TG_ID)
+    adjust_balance(session, TG_ID, 50, "admin_add")
+    task_id = _task(session, user.id)
+    with session.begin():
+        result = _charge(session, task_id, 79, DRAFT)
+    assert result == (CHARGE_INSUFFICIENT, 50, "Песня")
+    assert _balance(session) == 50
+    assert session.get(Task, task_id, populate_existing=True).status == DRAFT
+    assert _transactions(session) == 1
+
+
+def test_charge_task_does_not_charge_twice(session) -> None:
+    user = get_or_create_user(session, TG_ID)
+    adjust_balance(session, TG_ID, 200, "admin_add")
+    task_id = _task(session, user.id)
+    with session.begin():
+        assert _charge(session, task_id, 79, PAYMENT_WAITING)[0] == CHARGE_OK
+    with session.begin():
+        result = _charge(session, task_id, 79, PAYMENT_WAITING)
+    assert result == (CHARGE_NOT_PAYABLE, 121, None)
+    assert _balance(session) == 121
+    assert session.get(Task, task_id, populate_existing=True).status == AUDIO_QUEUED
+    assert _transactions(session) == 2
+
+
+def test_charge_task_missing_task(session) -> None:
+    adjust_balance(session, TG_ID, 100, "admin_add")
+    with session.begin():
+        result = _charge(session, 999, 79, PAYMENT_WAITING)
+    assert result == (CHARGE_NOT_PAYABLE, 100, None)
+    assert _balance(session) == 100
+    assert _transactions(session) == 1
@@ -0,0 +1,16 @@
+import importlib
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "app.bot.main",
+        "app.bot.handlers.create_track",
+        "app.api.main",
+        "app.worker.tasks",
+    ],
+)
+def test_module_imports(module: str) -> None:
+    importlib.import_module(module)